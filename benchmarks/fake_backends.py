@@ -0,0 +1,303 @@
+import io
+import gzip
+import base64
+import hashlib
+import threading
+import requests
+from opendatablend.storage import StorageBackend, AzureBlobStorageBackend, GoogleCloudStorageBackend, import_azure_storage, import_google_cloud_storage, default_gcs_chunk_size, gcs_chunk_size_multiple
+
+# In-process stand-ins for Azurite and the Google Cloud Storage service. They implement the parts of each SDK's client that the storage backends use and keep the blobs in memory, so the real backend code runs without a network service.
+
+
+class FakeAzureBlobProperties:
+    def __init__(self, blob):
+        self.size = len(blob.data)
+        self.etag = blob.etag
+        self.metadata = dict(blob.metadata or {})
+        self.content_settings = type('ContentSettings', (), {'content_md5': blob.content_md5, 'content_encoding': blob.content_encoding})()
+        self.copy = type('CopyProperties', (), {'status': 'success'})()
+
+
+class FakeAzureBlob:
+    def __init__(self, data, metadata, content_encoding=None, content_md5=None):
+        self.data = data
+        self.metadata = metadata
+        self.content_encoding = content_encoding
+        self.content_md5 = content_md5
+        self.etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        self.leased = False
+
+
+class FakeAzureLease:
+    def __init__(self, blob):
+        self.blob = blob
+
+    def renew(self):
+        pass
+
+    def release(self):
+        self.blob.leased = False
+
+
+class FakeAzureDownloader:
+    def __init__(self, data, chunk_size=4 * 1024 * 1024):
+        self.data = data
+        self.size = len(data)
+        self.chunk_size = chunk_size
+
+    def chunks(self):
+        for offset in range(0, len(self.data), self.chunk_size):
+            yield self.data[offset:offset + self.chunk_size]
+
+    def readall(self):
+        return self.data
+
+
+class FakeAzureBlobClient:
+    def __init__(self, container, blob_name):
+        self.container = container
+        self.blob_name = blob_name
+
+    def _get(self):
+        blob = self.container.blobs.get(self.blob_name)
+        if blob is None:
+            raise import_azure_storage().core.exceptions.ResourceNotFoundError(f"The blob {self.blob_name} does not exist.")
+        return blob
+
+    # Like the service, a blob uploaded in a single request is given the MD5 of its content, while a blob committed from blocks only has the MD5 that the client sets
+    def _put(self, data, metadata, overwrite=True, content_settings=None, single_request=True):
+        content_md5 = getattr(content_settings, 'content_md5', None)
+        if single_request and not content_md5:
+            content_md5 = bytearray(hashlib.md5(data).digest())
+
+        with self.container.lock:
+            if not overwrite and self.blob_name in self.container.blobs:
+                raise import_azure_storage().core.exceptions.ResourceExistsError(f"The blob {self.blob_name} already exists.")
+            self.container.blobs[self.blob_name] = FakeAzureBlob(bytes(data), metadata, content_settings.content_encoding if content_settings is not None else None, content_md5)
+
+    # The service fetches from a URL itself, which the stand-in does with a plain request
+    def _fetch(self, url, offset=None, length=None):
+        headers = {'Range': f'bytes={offset}-{offset + length - 1}'} if offset is not None else {}
+        response = requests.get(url, headers=headers)
+        response.raise_for_status()
+        return response.content
+
+    def exists(self):
+        return self.blob_name in self.container.blobs
+
+    def get_blob_properties(self):
+        return FakeAzureBlobProperties(self._get())
+
+    # Like the SDK, a gzip encoded blob is decompressed unless decompress is turned off
+    def download_blob(self, offset=None, length=None, decompress=True):
+        blob = self._get()
+        data = gzip.decompress(blob.data) if decompress and blob.content_encoding == 'gzip' else blob.data
+        if offset is not None:
+            data = data[offset:offset + length if length is not None else None]
+        return FakeAzureDownloader(data)
+
+    def upload_blob(self, data, overwrite=False, metadata=None, content_settings=None):
+        self._put(data if isinstance(data, (bytes, bytearray)) else data.read(), metadata, overwrite, content_settings)
+
+    def stage_block(self, block_id, data):
+        with self.container.lock:
+            self.container.blocks.setdefault(self.blob_name, {})[block_id] = bytes(data)
+
+    def stage_block_from_url(self, block_id, source_url, source_offset=None, source_length=None):
+        self.stage_block(block_id, self._fetch(source_url, source_offset, source_length))
+
+    def commit_block_list(self, block_list, metadata=None, content_settings=None):
+        with self.container.lock:
+            blocks = self.container.blocks.pop(self.blob_name, {})
+        self._put(b''.join(blocks[block.id] for block in block_list), metadata, content_settings=content_settings, single_request=False)
+
+    def upload_blob_from_url(self, source_url, overwrite=False, metadata=None):
+        self._put(self._fetch(source_url), metadata, overwrite)
+
+    def start_copy_from_url(self, source_url, metadata=None):
+        self._put(self._fetch(source_url), metadata)
+        return {'copy_status': 'success'}
+
+    def delete_blob(self):
+        with self.container.lock:
+            self.container.blobs.pop(self.blob_name, None)
+
+    def acquire_lease(self, lease_duration=-1):
+        with self.container.lock:
+            blob = self._get()
+            if blob.leased:
+                ex = import_azure_storage().core.exceptions.HttpResponseError(message=f"The blob {self.blob_name} is already leased.")
+                ex.status_code = 409
+                raise ex
+            blob.leased = True
+        return FakeAzureLease(blob)
+
+
+class FakeAzureContainerClient:
+    def __init__(self):
+        self.blobs = {}
+        self.blocks = {}
+        self.lock = threading.Lock()
+        self.created = False
+
+    def exists(self):
+        return self.created
+
+    def create_container(self):
+        self.created = True
+
+    def get_blob_client(self, blob_name):
+        return FakeAzureBlobClient(self, blob_name)
+
+
+# The Azure Blob Storage backend running against an in-memory container instead of Azurite or a storage account
+class FakeAzureBlobStorageBackend(AzureBlobStorageBackend):
+    def __init__(self, configuration):
+        StorageBackend.__init__(self, configuration)
+        self.connection_string = ''
+        self.container_name = configuration.get("container_name", 'benchmark')
+        self.blob_service_client = None
+        self.container_client = FakeAzureContainerClient()
+        self._container_exists = False
+        self._lock = threading.Lock()
+
+
+# Counts and hashes the bytes written to a blob rather than holding them, so the memory measured by the benchmarks is the memory used by the backend itself. The bytes are only kept if the bucket keeps data, which lets tests read blobs back.
+class FakeGcsBlobWriter:
+    def __init__(self, blob, chunk_size):
+        self.blob = blob
+        self.chunk_size = chunk_size
+        self._buffer = io.BytesIO() if blob.bucket.keep_data else None
+        self._size = 0
+        self._md5 = hashlib.md5()
+        self._terminated = False
+
+    def write(self, data):
+        self._size += len(data)
+        self._md5.update(data)
+        if self._buffer is not None:
+            self._buffer.write(data)
+        return len(data)
+
+    def close(self):
+        if not self._terminated:
+            self.blob._store(self._buffer.getvalue() if self._buffer is not None else None, size=self._size, md5=self._md5.digest())
+
+    def terminate(self):
+        self._terminated = True
+
+
+class FakeGcsBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.metadata = None
+        self.generation = None
+        self.size = None
+        self.md5_hash = None
+        self.etag = None
+
+    def _load(self, stored):
+        data, metadata, generation, size, md5 = stored
+        self.metadata = metadata
+        self.generation = generation
+        self.size = size
+        self.md5_hash = base64.b64encode(md5).decode()
+        self.etag = str(generation)
+        return self
+
+    def _check_generation(self, if_generation_match):
+        stored = self.bucket.blobs.get(self.name)
+        generation = stored[2] if stored is not None else 0
+        if if_generation_match is not None and generation != if_generation_match:
+            raise import_google_cloud_storage().api_core.exceptions.PreconditionFailed(f"The generation of {self.name} is {generation}.")
+        return stored
+
+    # Store a blob's bytes, or only its size and MD5 hash if the bytes weren't kept
+    def _store(self, data, if_generation_match=None, size=None, md5=None):
+        if data is not None:
+            data = bytes(data)
+            size = len(data)
+            md5 = hashlib.md5(data).digest()
+
+        with self.bucket.lock:
+            self._check_generation(if_generation_match)
+            self.bucket.generation += 1
+            self.bucket.blobs[self.name] = (data, self.metadata, self.bucket.generation, size, md5)
+            self._load(self.bucket.blobs[self.name])
+
+    def _get_data(self, stored):
+        if stored is None:
+            raise import_google_cloud_storage().api_core.exceptions.NotFound(f"The blob {self.name} does not exist.")
+        if stored[0] is None:
+            raise IOError(f"The bytes of {self.name} weren't kept. Set keep_data in the configuration to read blobs back.")
+        return stored[0]
+
+    def exists(self):
+        return self.name in self.bucket.blobs
+
+    def open(self, mode, chunk_size=None, ignore_flush=False, raw_download=False):
+        if mode == 'wb':
+            return FakeGcsBlobWriter(self, chunk_size)
+
+        return io.BytesIO(self._get_data(self.bucket.blobs.get(self.name)))
+
+    def upload_from_string(self, data, if_generation_match=None):
+        self._store(data.encode() if isinstance(data, str) else data, if_generation_match)
+
+    def download_as_bytes(self, if_generation_match=None):
+        with self.bucket.lock:
+            stored = self._check_generation(if_generation_match)
+        return self._get_data(stored)
+
+    def delete(self, if_generation_match=None):
+        with self.bucket.lock:
+            if self._check_generation(if_generation_match) is None:
+                raise import_google_cloud_storage().api_core.exceptions.NotFound(f"The blob {self.name} does not exist.")
+            del self.bucket.blobs[self.name]
+
+
+class FakeGcsBucket:
+    def __init__(self, keep_data=False):
+        self.keep_data = keep_data
+        self.blobs = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.created = False
+        self.storage_class = None
+
+    def exists(self):
+        return self.created
+
+    def blob(self, name):
+        return FakeGcsBlob(self, name)
+
+    def get_blob(self, name):
+        stored = self.blobs.get(name)
+        return FakeGcsBlob(self, name)._load(stored) if stored is not None else None
+
+
+class FakeGcsClient:
+    def __init__(self, keep_data=False):
+        self._bucket = FakeGcsBucket(keep_data)
+
+    def bucket(self, name):
+        return self._bucket
+
+    def create_bucket(self, bucket, location=None):
+        bucket.created = True
+
+
+# The Google Cloud Storage backend running against an in-memory bucket. Set keep_data in the configuration to keep the bytes of the blobs it streams so that they can be read back.
+class FakeGoogleCloudStorageBackend(GoogleCloudStorageBackend):
+    def __init__(self, configuration):
+        StorageBackend.__init__(self, configuration)
+        self.service_account_private_key_file = ''
+        self.bucket_name = configuration.get("bucket_name", 'benchmark')
+        self.bucket_location = configuration.get("bucket_location", '')
+        chunk_size = configuration.get("chunk_size", default_gcs_chunk_size)
+        self.chunk_size = -(-chunk_size // gcs_chunk_size_multiple) * gcs_chunk_size_multiple
+        self.storage_client = FakeGcsClient(configuration.get("keep_data", False))
+        self.bucket = self.storage_client.bucket(self.bucket_name)
+        self._bucket_exists = False
+        self._lock = threading.Lock()
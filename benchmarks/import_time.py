@@ -0,0 +1,43 @@
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# The modules that must not be imported by 'import opendatablend' because they are optional or slow to import
+lazy_modules = ['boto3', 'botocore', 'azure.storage.blob', 'google.cloud.storage', 'frictionless', 'pyarrow', 'pandas', 'aiohttp']
+
+# Import the package in a fresh interpreter and report the time taken and the lazy modules that were imported anyway
+measure_script = f"""
+import sys, time, json
+start_time = time.perf_counter()
+import opendatablend
+seconds = time.perf_counter() - start_time
+print(json.dumps({{"seconds": seconds, "imported": [name for name in {lazy_modules!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import():
+    result = subprocess.run([sys.executable, '-c', measure_script], capture_output=True, text=True, check=True)
+
+    return json.loads(result.stdout)
+
+
+# Time 'import opendatablend' in fresh interpreters. Exits with status 1 if the median time is over the limit or a lazy module was imported.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the time taken to import opendatablend.")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--max-seconds', type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    results = [measure_import() for _ in range(args.runs)]
+    seconds = [result["seconds"] for result in results]
+    imported = sorted({name for result in results for name in result["imported"]})
+
+    print(json.dumps({"benchmark": "import_time", "runs": args.runs, "median_seconds": round(statistics.median(seconds), 4), "max_seconds": round(max(seconds), 4), "lazy_modules_imported": imported}))
+
+    return 1 if imported or statistics.median(seconds) > args.max_seconds else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
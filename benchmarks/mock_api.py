@@ -0,0 +1,171 @@
+import json
+import hashlib
+import threading
+import collections
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Synthetic data files are built by repeating a block of pseudo-random bytes, so they don't need to be held in memory
+synthetic_block_size = 1024 * 1024
+response_chunk_size = 1024 * 1024
+
+
+# A data file of any size whose bytes are derived from a seed
+class SyntheticDataFile:
+    def __init__(self, name, size, seed):
+        self.name = name
+        self.size = size
+
+        block = bytearray()
+        digest = hashlib.sha256(str(seed).encode()).digest()
+        while len(block) < synthetic_block_size:
+            digest = hashlib.sha256(digest).digest()
+            block += digest
+        self.block = bytes(block[:synthetic_block_size])
+
+        md5 = hashlib.md5()
+        for chunk in self.iter_range(0, size):
+            md5.update(chunk)
+        self.md5 = md5.hexdigest()
+
+    def iter_range(self, start, end):
+        offset = start
+        while offset < end:
+            block_offset = offset % synthetic_block_size
+            length = min(end - offset, synthetic_block_size - block_offset, response_chunk_size)
+            yield self.block[block_offset:block_offset + length]
+            offset += length
+
+
+# Clients close connections part way through a response, such as when they only need the headers, so these are not reported as errors
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+# Serves a dataset metadata file and its synthetic data files, counting the requests made for each kind of path
+class MockDatasetApi:
+    def __init__(self, file_count=4, file_size=16 * 1024 * 1024, dataset_name='benchmark-dataset', host='127.0.0.1', port=0):
+        self.dataset_name = dataset_name
+        self.data_files = {f'/v1/{dataset_name}/resources/{name}/{name}.bin': SyntheticDataFile(name, file_size, index) for index, name in enumerate(f'resource-{index}' for index in range(file_count))}
+        self.counts = collections.Counter()
+        self._lock = threading.Lock()
+        self.server = QuietHTTPServer((host, port), self.get_handler())
+        self.base_url = f'http://{host}:{self.server.server_address[1]}'
+
+    @property
+    def dataset_path(self):
+        return f'{self.base_url}/v1/{self.dataset_name}/datapackage.json'
+
+    @property
+    def resource_names(self):
+        return [data_file.name for data_file in self.data_files.values()]
+
+    def get_descriptor(self):
+        resources = [{'name': data_file.name, 'path': self.base_url + path, 'format': 'bin', 'bytes': data_file.size, 'hash': data_file.md5} for path, data_file in self.data_files.items()]
+
+        return json.dumps({'name': self.dataset_name, 'snapshot_path': f'{self.base_url}/v1/{self.dataset_name}/snapshots/1/datapackage.json', 'resources': resources}).encode()
+
+    def count(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def get_counts(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts.clear()
+
+    def get_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.do_GET(head=True)
+
+            def do_GET(self, head=False):
+                path = self.path.split('?')[0]
+
+                # The counters can be read and reset by the benchmark, which may run in another process
+                if path == '/_counts':
+                    return self.send_body(json.dumps(api.get_counts()).encode(), 'application/json')
+                if path == '/_reset':
+                    api.reset_counts()
+                    return self.send_body(b'{}', 'application/json')
+
+                if path.endswith('datapackage.json'):
+                    api.count('head_descriptor' if head else 'descriptor')
+                    return self.send_body(api.get_descriptor(), 'application/json', head)
+
+                data_file = api.data_files.get(path)
+                if data_file is None:
+                    api.count('not_found')
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                start, end = 0, data_file.size
+                range_header = self.headers.get('Range')
+                if head:
+                    api.count('head_data_file')
+                elif range_header:
+                    api.count('ranged_data_file')
+                else:
+                    api.count('data_file')
+
+                if range_header:
+                    first, last = range_header.split('=')[1].split('-')
+                    start = int(first)
+                    end = min(int(last) + 1, data_file.size) if last else data_file.size
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end - 1}/{data_file.size}')
+                else:
+                    self.send_response(200)
+
+                self.send_header('Content-Length', str(end - start))
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('ETag', f'"{data_file.md5}"')
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+
+                if not head:
+                    try:
+                        for chunk in data_file.iter_range(start, end):
+                            self.wfile.write(chunk)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # The client only wanted the headers, such as when it resolves the location of a data file
+                        self.close_connection = True
+                        return
+                    with api._lock:
+                        api.counts['bytes_served'] += end - start
+
+            def send_body(self, body, content_type, head=False):
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Content-Type', content_type)
+                self.send_header('ETag', '"' + hashlib.md5(body).hexdigest() + '"')
+                self.end_headers()
+                if not head:
+                    self.wfile.write(body)
+
+        return Handler
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
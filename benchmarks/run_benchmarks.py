@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import shutil
+import tracemalloc
+import multiprocessing
+from contextlib import contextmanager, nullcontext
+import requests
+import opendatablend as odb
+from mock_api import MockDatasetApi
+from fake_backends import FakeAzureBlobStorageBackend, FakeGoogleCloudStorageBackend
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+size_units = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+default_backends = ['local', 'local_segmented', 'memory', 'amazon_s3', 'azure_blob_storage', 'google_cloud_storage']
+
+
+def parse_size(value):
+    value = value.strip().upper()
+    for unit, multiple in size_units.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * multiple)
+
+    return int(value)
+
+
+# Run the mock Dataset API in its own process so that serving the data files doesn't count towards the memory and CPU used by the benchmark
+def run_mock_api(file_count, file_size, queue):
+    api = MockDatasetApi(file_count, file_size)
+    queue.put((api.base_url, api.dataset_path, api.resource_names))
+    api.serve_forever()
+
+
+def start_mock_api(file_count, file_size):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_mock_api, args=(file_count, file_size, queue), daemon=True)
+    process.start()
+
+    return (process,) + queue.get(timeout=300)
+
+
+@contextmanager
+def mock_amazon_s3():
+    try:
+        from moto import mock_aws
+    except ImportError:
+        raise ImportError("The amazon_s3 benchmark requires the moto package. Install it with 'pip install moto'.")
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-2')
+
+    with mock_aws():
+        yield
+
+
+# Get the file system, configuration and context for each benchmarked backend. The cloud backends run against in-process stand-ins.
+def get_backend(name):
+    if name == 'local':
+        return 'local', {}, nullcontext()
+    if name == 'local_segmented':
+        return 'local', {"segments": 4, "segment_threshold": 0}, nullcontext()
+    if name == 'memory':
+        return 'memory', {}, nullcontext()
+    if name == 'amazon_s3':
+        return 'amazon_s3', {"aws_access_key_id": 'benchmark', "aws_secret_access_key": 'benchmark', "bucket_name": 'benchmark', "bucket_region": 'eu-west-2'}, mock_amazon_s3()
+    if name == 'azure_blob_storage':
+        odb.register_storage_backend('fake_azure_blob_storage', FakeAzureBlobStorageBackend)
+        return 'fake_azure_blob_storage', {"container_name": 'benchmark'}, nullcontext()
+    if name == 'google_cloud_storage':
+        odb.register_storage_backend('fake_google_cloud_storage', FakeGoogleCloudStorageBackend)
+        return 'fake_google_cloud_storage', {"bucket_name": 'benchmark', "bucket_location": ''}, nullcontext()
+
+    raise ValueError(f"The backend '{name}' is not supported. Please choose one of {', '.join(default_backends)}.")
+
+
+def get_max_rss_bytes():
+    if resource is None:
+        return None
+
+    # Linux reports the peak resident set size in kilobytes and macOS in bytes
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+# Cache every data file in the dataset once and measure the time taken, the peak memory allocated and the requests made to the API
+def measure(backend_name, scenario, api, file_system, configuration, base_path, workers):
+    base_url, dataset_path, resource_names = api
+    requests.get(base_url + '/_reset').raise_for_status()
+
+    # The dataset metadata is fetched again for each run, as it would be by a new process
+    odb.clear_metadata_cache()
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    output = odb.get_data_files(dataset_path, resource_names, base_path, file_system=file_system, configuration=configuration, max_workers=workers, raise_errors=False)
+    seconds = time.perf_counter() - start_time
+    peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    bytes_transferred = sum(metrics.bytes_transferred for metrics in output.metrics.values())
+
+    return {
+        "backend": backend_name,
+        "scenario": scenario,
+        "files": len(resource_names),
+        "workers": workers,
+        "seconds": round(seconds, 4),
+        "bytes_transferred": bytes_transferred,
+        "throughput_mb_per_second": round(bytes_transferred / seconds / size_units['MB'], 2) if seconds > 0 else None,
+        "peak_traced_bytes": peak_traced_bytes,
+        "max_rss_bytes": get_max_rss_bytes(),
+        "requests": requests.get(base_url + '/_counts').json(),
+        "errors": {resource_name: str(error) for resource_name, error in output.errors.items()}
+    }
+
+
+# Run a cold and a warm pass for each backend. The warm pass finds every data file in the cache, so it should make no data file requests.
+def run_benchmarks(backends, file_count, file_size, workers):
+    process, base_url, dataset_path, resource_names = start_mock_api(file_count, file_size)
+    api = (base_url, dataset_path, resource_names)
+    results = []
+
+    # Load the dataset metadata once so that the time taken to import the libraries it needs isn't counted against the first backend
+    odb.metadata.get_dataset(dataset_path)
+
+    try:
+        for backend_name in backends:
+            file_system, configuration, context = get_backend(backend_name)
+            base_path = tempfile.mkdtemp(prefix='opendatablend-benchmark-') + '/'
+
+            try:
+                with context:
+                    # Create the backend, and import its SDK, before the first measurement
+                    odb.clear_storage_backends()
+                    odb.get_storage_backend(file_system, configuration)
+
+                    for scenario in ('cold', 'warm'):
+                        result = measure(backend_name, scenario, api, file_system, configuration, base_path, workers)
+                        print(json.dumps(result), flush=True)
+                        results.append(result)
+            finally:
+                odb.clear_storage_backends()
+                shutil.rmtree(base_path, ignore_errors=True)
+    finally:
+        process.terminate()
+
+    return results
+
+
+# Compare the results with a baseline from an earlier run. Throughput may vary between machines, so it only fails when it drops by more than the tolerance, but the request counts are expected to match exactly.
+def compare_with_baseline(results, baseline, tolerance):
+    baseline_results = {(result["backend"], result["scenario"]): result for result in baseline}
+    regressions = []
+
+    for result in results:
+        previous = baseline_results.get((result["backend"], result["scenario"]))
+        if previous is None:
+            continue
+
+        name = f"{result['backend']} {result['scenario']}"
+
+        if previous["throughput_mb_per_second"] and result["throughput_mb_per_second"] is not None and result["throughput_mb_per_second"] < previous["throughput_mb_per_second"] * (1 - tolerance):
+            regressions.append(f"{name}: the throughput fell from {previous['throughput_mb_per_second']} to {result['throughput_mb_per_second']} MB/s")
+
+        if result["peak_traced_bytes"] > previous["peak_traced_bytes"] * (1 + tolerance):
+            regressions.append(f"{name}: the peak memory rose from {previous['peak_traced_bytes']} to {result['peak_traced_bytes']} bytes")
+
+        for kind, count in result["requests"].items():
+            if kind != 'bytes_served' and count > previous["requests"].get(kind, 0):
+                regressions.append(f"{name}: the number of {kind} requests rose from {previous['requests'].get(kind, 0)} to {count}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark caching data files from a mock Dataset API into each storage backend. Each result is written to standard output as a JSON object.")
+    parser.add_argument('--backends', default=','.join(default_backends), help="A comma separated list of the backends to benchmark.")
+    parser.add_argument('--files', type=int, default=4, help="The number of data files in the dataset.")
+    parser.add_argument('--size', default='16MB', help="The size of each data file, e.g. 512KB, 16MB or 1GB.")
+    parser.add_argument('--workers', type=int, default=4, help="The number of data files cached at once.")
+    parser.add_argument('--output', help="A file to save the results to, which can be used as a baseline for a later run.")
+    parser.add_argument('--baseline', help="The results of an earlier run. The benchmark fails if this run has regressed.")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="The fraction by which throughput and peak memory may be worse than the baseline.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks([name.strip() for name in args.backends.split(',') if name.strip()], args.files, parse_size(args.size), args.workers)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    failed = [result for result in results if result["errors"]]
+    for result in failed:
+        print(f"{result['backend']} {result['scenario']} failed: {result['errors']}", file=sys.stderr)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_with_baseline(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,9 @@
-from opendatablend.opendatablend import get_data, get_data_files
\ No newline at end of file
+from opendatablend.opendatablend import get_data, get_data_files
+from opendatablend.aio import aget_data, aget_data_files
+from opendatablend.readers import load_data, read_resource, iter_resource
+from opendatablend.metadata import MetadataCache, metadata_cache, clear_metadata_cache
+from opendatablend.storage import StorageBackend, StorageObjectInfo, StorageWriter, DataFileValidationError, register_storage_backend, get_storage_backend, clear_storage_backends
+from opendatablend.cache_index import list_cached, cache_stats, evict_cached, CachedDataFile, CacheStats
+from opendatablend.sync import sync, plan_sync, SyncSummary, SyncTransfer
+from opendatablend.verify import verify_cache, VerifiedDataFile, CacheVerification
+from opendatablend.metrics import TransferMetrics, MetricsCounters, LoggingMetricsHook, add_metrics_hook, remove_metrics_hook
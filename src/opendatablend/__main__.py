@@ -0,0 +1,4 @@
+import sys
+from opendatablend.cli import main
+
+sys.exit(main())
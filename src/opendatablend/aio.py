@@ -0,0 +1,247 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from opendatablend.opendatablend import Output, OutputSet, get_data_file_name, get_cached_data_file_name, check_cached_data_file, transfer_data_file, record_cached_data_file, cache_dataset_metadata
+from opendatablend.api import get_download_path, get_retry_delay, record_response_status, concurrency_limiter, default_pool_maxsize, default_connect_timeout, default_read_timeout, default_max_attempts, retry_status_codes
+from opendatablend.metadata import get_dataset
+from opendatablend.metrics import TransferMetrics, emit_metrics, logger
+from opendatablend.storage import StorageBackend, TimeoutStorageLock, storage_backends, get_storage_backend, get_source_metadata, get_transfer_size, default_chunk_size, cache_metadata_hash
+
+# The number of data files downloaded at once by aget_data_files when no limit is given
+default_max_concurrency = 8
+
+# How often a transfer checks for a free slot while the API is throttling requests
+default_limiter_poll_interval = 0.05
+
+
+def import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError("The async API requires the aiohttp package. Install it with 'pip install opendatablend[async]'.")
+
+    return aiohttp
+
+
+# Run a blocking call, such as a storage SDK request, without stalling the event loop
+async def run_blocking(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+# Wait for a slot from the shared concurrency limiter without blocking the event loop
+@asynccontextmanager
+async def alimiter_slot():
+    while not concurrency_limiter.try_acquire():
+        await asyncio.sleep(default_limiter_poll_interval)
+
+    try:
+        yield
+    finally:
+        concurrency_limiter.release()
+
+
+# Wait for a storage lock without holding an executor thread between attempts. The transfer that holds the lock needs executor threads to finish and release it, so waiters blocking them could stall it for good.
+async def aacquire_lock(lock):
+    if not isinstance(lock, TimeoutStorageLock):
+        await run_blocking(lock.acquire)
+        return
+
+    deadline = time.monotonic() + lock.timeout if lock.timeout is not None else None
+
+    while not await run_blocking(lock.try_acquire):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"Timed out waiting for the lock on {lock.name}.")
+        await asyncio.sleep(lock.poll_interval)
+
+
+# Open a URL with the same timeouts and retries as the HTTP session used by the synchronous API
+@asynccontextmanager
+async def aopen_url(http_session, url):
+    aiohttp = import_aiohttp()
+    timeout = aiohttp.ClientTimeout(sock_connect=default_connect_timeout, sock_read=default_read_timeout)
+
+    for attempt in range(default_max_attempts):
+        try:
+            response = await http_session.get(url, timeout=timeout)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == default_max_attempts - 1:
+                raise
+            await asyncio.sleep(get_retry_delay(attempt))
+            continue
+
+        record_response_status(response.status)
+
+        if response.status not in retry_status_codes or attempt == default_max_attempts - 1:
+            break
+
+        delay = get_retry_delay(attempt, response.headers.get('Retry-After'))
+        response.release()
+        await asyncio.sleep(delay)
+
+    try:
+        yield response
+    finally:
+        response.release()
+
+
+# Get and cache a data file and the dataset metadata without blocking the event loop
+async def aget_data(dataset_path, resource_name, base_path='/', access_key='', file_system='local', configuration={}, refresh=False, session=None, convert_to_parquet=False):
+    output_set = await aget_data_files(dataset_path, [resource_name], base_path, access_key, file_system, configuration, refresh=refresh, session=session, convert_to_parquet=convert_to_parquet)
+
+    # Return the output object which contains the fully qualified file names
+    return Output(output_set.data_file_names[0], output_set.metadata_file_name, output_set.metrics.get(resource_name))
+
+
+# Get and cache a collection of data files and the dataset metadata, downloading up to max_concurrency data files at once. Pass the same semaphore to several calls to share one limit between them.
+# As with get_data_files, a data file that fails to download raises its error, once the rest of the batch has finished. Set raise_errors to False to record the failures in the errors of the output instead.
+async def aget_data_files(dataset_path, resource_names, base_path='/', access_key='', file_system='local', configuration={}, max_concurrency=default_max_concurrency, refresh=False, session=None, semaphore=None, convert_to_parquet=False, raise_errors=True):
+    aiohttp = import_aiohttp()
+
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+    # Get the dataset metadata once for the whole batch. It is held in the shared metadata cache so this is usually instant.
+    start_time = time.perf_counter()
+    dataset = await run_blocking(get_dataset, dataset_path)
+    descriptor_seconds = time.perf_counter() - start_time
+
+    data_file_names = [''] * len(resource_names)
+    timings = {}
+    errors = {}
+    metrics = {}
+
+    async def cache_timed_resource(index, resource_name, http_session):
+        async with semaphore:
+            # Every data file in the batch waited on the same dataset metadata
+            resource_metrics = TransferMetrics(resource_name, file_system)
+            resource_metrics.add_phase_time('descriptor', descriptor_seconds)
+            metrics[resource_name] = resource_metrics
+
+            start_time = time.perf_counter()
+            try:
+                data_file_names[index] = await acache_resource(dataset, resource_name, base_path, access_key, file_system, configuration, refresh, http_session, resource_metrics, convert_to_parquet)
+            except Exception as ex:
+                # Record the failure and carry on so that one bad data file does not stop the rest of the batch
+                errors[resource_name] = ex
+                resource_metrics.error = ex
+                logger.warning(f"The data file for resource '{resource_name}' could not be cached: {ex}")
+            finally:
+                timings[resource_name] = time.perf_counter() - start_time
+                emit_metrics(resource_metrics)
+
+    if session is None:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=default_pool_maxsize)) as http_session:
+            await asyncio.gather(*[cache_timed_resource(index, resource_name, http_session) for index, resource_name in enumerate(resource_names)])
+    else:
+        await asyncio.gather(*[cache_timed_resource(index, resource_name, session) for index, resource_name in enumerate(resource_names)])
+
+    if raise_errors:
+        for resource_name in resource_names:
+            if resource_name in errors:
+                raise errors[resource_name]
+
+    # Save a copy of the dataset metadata to the specific file system once all of the data files have been cached, if any were
+    metadata_file_name = ''
+    if dataset_path.startswith('http') and any(data_file_names):
+        metadata_file_name = await run_blocking(cache_dataset_metadata, dataset, base_path, file_system, configuration)
+
+    # Return the output object which contains the fully qualified file names
+    return OutputSet(data_file_names, metadata_file_name, timings, errors, metrics)
+
+
+# Hold the lock on a data file while it is cached, in the same way as cache_lock, but wait for it on the event loop
+@asynccontextmanager
+async def acache_lock(backend, output_data_file_name, metrics, check_cached):
+    lock = await run_blocking(backend.lock, output_data_file_name)
+    start_time = time.perf_counter()
+    await aacquire_lock(lock)
+    metrics.add_phase_time('lock_wait', time.perf_counter() - start_time)
+
+    try:
+        start_time = time.perf_counter()
+        result = await run_blocking(check_cached)
+        metrics.add_phase_time('exists_check', time.perf_counter() - start_time)
+        yield result
+    finally:
+        await run_blocking(lock.release)
+
+
+# Data files are streamed through the event loop unless they are converted, which is CPU bound, or the backend has its own way of transferring them, such as the resumable and segmented downloads of the local file system or the server-side copies of Azure Blob Storage. Those run in the executor.
+def is_streamed_on_event_loop(backend, convert):
+    return not convert and type(backend).upload_from_url is StorageBackend.upload_from_url
+
+
+async def acache_resource(dataset, resource_name, base_path, access_key, file_system, configuration, refresh, http_session, metrics, convert_to_parquet=False):
+    if file_system not in storage_backends:
+        raise ValueError(f"The file system '{file_system}' is not supported.")
+
+    # Get the data file metadata
+    data_file = dataset.get_resource(resource_name)
+
+    backend = await run_blocking(get_storage_backend, file_system, configuration)
+
+    output_data_file_name, convert, content_encoding = get_cached_data_file_name(backend, data_file, get_data_file_name(data_file, base_path), convert_to_parquet)
+    data_file_download_path = get_download_path(data_file, access_key)
+    metrics.data_file_name = output_data_file_name
+
+    def check_cached():
+        return check_cached_data_file(backend, output_data_file_name, data_file, data_file_download_path, refresh, content_encoding)
+
+    start_time = time.perf_counter()
+    is_cached, cache_metadata = await run_blocking(check_cached)
+    metrics.add_phase_time('exists_check', time.perf_counter() - start_time)
+
+    if not is_cached:
+        async with acache_lock(backend, output_data_file_name, metrics, check_cached) as (is_cached, cache_metadata):
+            if not is_cached:
+                # Transfers wait for a slot so fewer run at once while the API is throttling requests
+                async with alimiter_slot():
+                    if is_streamed_on_event_loop(backend, convert):
+                        await astream_to_backend(backend, output_data_file_name, data_file_download_path, cache_metadata, http_session, metrics)
+                    else:
+                        await run_blocking(transfer_data_file, backend, output_data_file_name, data_file_download_path, data_file, cache_metadata, metrics, convert)
+
+    metrics.cache_hit = is_cached
+    await run_blocking(record_cached_data_file, backend, base_path, data_file, output_data_file_name, cache_metadata.get(cache_metadata_hash), is_cached, configuration)
+
+    # Return the data file name at the relative path so it can be used
+    return output_data_file_name
+
+
+# Stream a file from a URL into a storage backend. The download runs on the event loop while each write runs in the executor, because writes may upload a part to a storage service.
+async def astream_to_backend(backend, file_name, url, metadata, http_session, metrics):
+    validator = backend.get_validator(metadata)
+
+    async with aopen_url(http_session, url) as response:
+        response.raise_for_status()
+
+        writer = await run_blocking(backend.open_encoded_write, file_name, get_source_metadata(metadata, response.headers, validator), get_transfer_size(metadata, response.headers))
+
+        try:
+            chunks = response.content.iter_chunked(default_chunk_size)
+            while True:
+                start_time = time.perf_counter()
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    metrics.add_phase_time('download', time.perf_counter() - start_time)
+
+                metrics.add_bytes(len(chunk))
+                validator.update(chunk)
+
+                start_time = time.perf_counter()
+                await run_blocking(writer.write, chunk)
+                metrics.add_phase_time('upload', time.perf_counter() - start_time)
+
+            # Abort the upload rather than cache a file that doesn't match its metadata
+            validator.validate(file_name)
+        except BaseException:
+            await run_blocking(writer.abort)
+            raise
+
+        # Closing the writer sends the last part and completes the upload
+        start_time = time.perf_counter()
+        await run_blocking(writer.close)
+        metrics.add_phase_time('upload', time.perf_counter() - start_time)
@@ -0,0 +1,163 @@
+import time
+import random
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+# The number of pooled connections kept open to each Open Data Blend API host
+default_pool_maxsize = 32
+
+# Requests give up if a connection can't be made, or no bytes arrive, within these many seconds
+default_connect_timeout = 10
+default_read_timeout = 60
+
+# Failed requests are retried with exponential backoff and jitter, or after the delay the server asks for with Retry-After
+default_max_attempts = 5
+default_backoff_factor = 0.5
+default_max_backoff = 60
+retry_status_codes = {429, 500, 502, 503, 504}
+throttle_status_codes = {429, 503}
+retry_methods = {'GET', 'HEAD', 'OPTIONS'}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# Get how long to wait before retrying a request, honouring a Retry-After header if the server sent one
+def get_retry_delay(attempt, retry_after=None):
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+
+        if delay is not None:
+            return min(max(delay, 0), default_max_backoff)
+
+    # Full jitter stops clients that failed together from retrying together
+    return random.uniform(0, min(default_max_backoff, default_backoff_factor * 2 ** attempt))
+
+
+# Limits the number of data files transferred at once. The limit is halved when the API throttles requests and grows by one again after each round of requests that succeed.
+class AdaptiveConcurrencyLimiter:
+    def __init__(self, max_limit=default_pool_maxsize, min_limit=1, cooldown=1.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max_limit
+        self.active = 0
+        # Throttled responses that arrive together count as one, so the limit isn't cut to the minimum by a single burst
+        self.cooldown = cooldown
+        self._last_decrease = 0.0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            self.active += 1
+
+    # Take a slot if one is free without waiting, for callers that wait in their own way such as an event loop
+    def try_acquire(self):
+        with self._condition:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def throttled(self):
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self._last_decrease = now
+                self._successes = 0
+
+    def succeeded(self):
+        with self._condition:
+            if self.limit >= self.max_limit:
+                return
+
+            self._successes += 1
+            if self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+
+# The limiter shared by every transfer in the process
+concurrency_limiter = AdaptiveConcurrencyLimiter()
+
+
+# Report the outcome of a request to the concurrency limiter
+def record_response_status(status_code):
+    if status_code in throttle_status_codes:
+        concurrency_limiter.throttled()
+    elif status_code < 400:
+        concurrency_limiter.succeeded()
+
+
+# A session that sets a timeout on every request and retries requests that fail with a connection error or a transient status code
+class ApiSession(requests.Session):
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (default_connect_timeout, default_read_timeout))
+        attempts = default_max_attempts if method.upper() in retry_methods else 1
+
+        for attempt in range(attempts):
+            try:
+                response = super().request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(get_retry_delay(attempt))
+                continue
+
+            record_response_status(response.status_code)
+
+            if response.status_code not in retry_status_codes or attempt == attempts - 1:
+                return response
+
+            delay = get_retry_delay(attempt, response.headers.get('Retry-After'))
+            response.close()
+            time.sleep(delay)
+
+
+# Get the HTTP session shared by every request made to the Open Data Blend API so that connections are reused
+def get_session():
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            session = ApiSession()
+            adapter = HTTPAdapter(pool_connections=default_pool_maxsize, pool_maxsize=default_pool_maxsize)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+
+        return _session
+
+
+# Build the URL used to download a data file, including the access key for authenticated requests
+def get_download_path(data_file, access_key):
+    if access_key != '':
+        return data_file.path + '?accesskey=' + access_key
+    else:
+        return data_file.path
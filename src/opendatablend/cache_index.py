@@ -0,0 +1,180 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import closing
+from opendatablend.metrics import logger
+from opendatablend.storage import LocalStorageBackend, LocalFileLock
+
+# The cache index is a SQLite database kept in the base path of the local file system
+cache_index_file_name = '.opendatablend-cache-index.sqlite'
+
+# How long to wait for another process that is writing to the cache index
+cache_index_timeout = 30
+
+
+class CachedDataFile:
+    def __init__(self, data_file_name, dataset_name, resource_name, size, hash, fetched_at, last_accessed):
+        self.data_file_name = data_file_name
+        self.dataset_name = dataset_name
+        self.resource_name = resource_name
+        self.size = size
+        self.hash = hash
+        # Seconds since the epoch when the data file was downloaded and when it was last requested
+        self.fetched_at = fetched_at
+        self.last_accessed = last_accessed
+
+
+class CacheStats:
+    def __init__(self, file_count, total_bytes, bytes_per_dataset):
+        self.file_count = file_count
+        self.total_bytes = total_bytes
+        self.bytes_per_dataset = bytes_per_dataset
+
+
+# A record of the data files cached in the local file system under one base path, so the cache can be listed and trimmed without walking the folder tree
+class CacheIndex:
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.index_file_name = os.path.join(base_path, cache_index_file_name)
+        self._lock = threading.Lock()
+        self._created = False
+
+    def connect(self):
+        if not self._created:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_file_name)), exist_ok=True)
+
+        # A connection per call lets threads and processes share the index, with SQLite locking the file between them
+        connection = sqlite3.connect(self.index_file_name, timeout=cache_index_timeout)
+
+        if not self._created:
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS cached_data_files (data_file_name TEXT PRIMARY KEY, dataset_name TEXT, resource_name TEXT, size INTEGER, hash TEXT, fetched_at REAL, last_accessed REAL)")
+                connection.execute("CREATE INDEX IF NOT EXISTS cached_data_files_last_accessed ON cached_data_files (last_accessed)")
+            self._created = True
+
+        return connection
+
+    # Record that a data file was requested. Data files that were found in the cache keep the time they were first fetched.
+    def record(self, data_file_name, dataset_name, resource_name, size, hash, fetched):
+        now = time.time()
+
+        with closing(self.connect()) as connection, connection:
+            if fetched:
+                connection.execute("INSERT OR REPLACE INTO cached_data_files VALUES (?, ?, ?, ?, ?, ?, ?)", (data_file_name, dataset_name, resource_name, size, hash, now, now))
+            else:
+                # Data files cached before the index existed are dated by their modification time
+                fetched_at = os.path.getmtime(data_file_name) if os.path.exists(data_file_name) else now
+                connection.execute("INSERT OR IGNORE INTO cached_data_files VALUES (?, ?, ?, ?, ?, ?, ?)", (data_file_name, dataset_name, resource_name, size, hash, fetched_at, now))
+                connection.execute("UPDATE cached_data_files SET last_accessed = ? WHERE data_file_name = ?", (now, data_file_name))
+
+    def remove(self, data_file_name):
+        with closing(self.connect()) as connection, connection:
+            connection.execute("DELETE FROM cached_data_files WHERE data_file_name = ?", (data_file_name,))
+
+    def list(self):
+        with closing(self.connect()) as connection:
+            rows = connection.execute("SELECT data_file_name, dataset_name, resource_name, size, hash, fetched_at, last_accessed FROM cached_data_files ORDER BY last_accessed DESC").fetchall()
+
+        return [CachedDataFile(*row) for row in rows]
+
+    def stats(self):
+        with closing(self.connect()) as connection:
+            rows = connection.execute("SELECT dataset_name, COUNT(*), SUM(size) FROM cached_data_files GROUP BY dataset_name").fetchall()
+
+        return CacheStats(sum(row[1] for row in rows), sum(row[2] or 0 for row in rows), {row[0]: row[2] or 0 for row in rows})
+
+    # Delete the least recently used data files until the cache is no larger than max_size bytes. Returns the names of the deleted data files. Data files that are locked because they are being cached are skipped.
+    def evict(self, max_size, keep=()):
+        evicted = []
+        backend = LocalStorageBackend({})
+
+        with self._lock, closing(self.connect()) as connection:
+            total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cached_data_files").fetchone()[0]
+            if total_bytes <= max_size:
+                return evicted
+
+            for data_file_name, size in connection.execute("SELECT data_file_name, size FROM cached_data_files ORDER BY last_accessed").fetchall():
+                if total_bytes <= max_size:
+                    break
+                if data_file_name in keep:
+                    continue
+
+                lock = backend.lock(data_file_name)
+                if not lock.try_acquire():
+                    continue
+
+                try:
+                    remove_local_data_file(data_file_name)
+                finally:
+                    lock.release()
+
+                with connection:
+                    connection.execute("DELETE FROM cached_data_files WHERE data_file_name = ?", (data_file_name,))
+
+                total_bytes -= size or 0
+                evicted.append(data_file_name)
+
+        return evicted
+
+
+# Delete a cached data file along with its metadata file and lock file
+def remove_local_data_file(data_file_name):
+    for file_name in (data_file_name, LocalStorageBackend({}).get_metadata_file_name(data_file_name)):
+        if os.path.exists(file_name):
+            os.remove(file_name)
+
+    # Windows doesn't allow an open file to be removed, so a lock file that is held there is left in place
+    try:
+        os.remove(LocalFileLock(data_file_name).lock_file_name)
+    except OSError:
+        pass
+
+
+_cache_indexes = {}
+_cache_indexes_lock = threading.Lock()
+
+
+# Get the cache index for a base path. The index object is shared so that evictions within the process are serialised.
+def get_cache_index(base_path):
+    key = os.path.abspath(base_path)
+
+    with _cache_indexes_lock:
+        if key not in _cache_indexes:
+            _cache_indexes[key] = CacheIndex(base_path)
+
+        return _cache_indexes[key]
+
+
+# Record a data file that was requested from the local file system and, if the configuration sets a max_size in bytes, evict the least recently used data files to stay within it
+def record_local_data_file(base_path, data_file, data_file_name, data_file_hash, cache_hit, configuration):
+    if not data_file_name or not os.path.exists(data_file_name):
+        return
+
+    package = getattr(data_file, 'package', None)
+    dataset_name = package.get('name', '') if package is not None else ''
+
+    # The data file has been cached by now, so a cache index that is locked or can't be written is reported rather than failing the request
+    try:
+        cache_index = get_cache_index(base_path)
+        cache_index.record(data_file_name, dataset_name, data_file.name, os.path.getsize(data_file_name), data_file_hash, not cache_hit)
+
+        max_size = configuration.get("max_size")
+        if max_size is not None:
+            cache_index.evict(max_size, keep={data_file_name})
+    except (sqlite3.Error, OSError) as ex:
+        logger.warning(f"The cache index in '{base_path}' could not be updated for {data_file_name}: {ex}")
+
+
+# List the data files cached in the local file system under a base path, most recently used first
+def list_cached(base_path='/'):
+    return get_cache_index(base_path).list()
+
+
+def cache_stats(base_path='/'):
+    return get_cache_index(base_path).stats()
+
+
+# Delete the least recently used data files cached under a base path until the cache is no larger than max_size bytes
+def evict_cached(base_path='/', max_size=0):
+    return get_cache_index(base_path).evict(max_size)
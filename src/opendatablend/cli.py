@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import argparse
+import threading
+from contextlib import redirect_stdout
+from opendatablend.opendatablend import get_data_files
+from opendatablend.sync import sync, plan_sync, default_sync_max_workers, default_sync_max_workers_per_host, default_sync_max_workers_per_backend
+from opendatablend.cache_index import list_cached, cache_stats
+from opendatablend.verify import verify_cache
+from opendatablend.metrics import add_metrics_hook, remove_metrics_hook
+
+# Settings that aren't given on the command line are read from these environment variables
+environment_access_key = 'OPENDATABLEND_ACCESS_KEY'
+environment_file_system = 'OPENDATABLEND_FILE_SYSTEM'
+environment_base_path = 'OPENDATABLEND_BASE_PATH'
+environment_config_file = 'OPENDATABLEND_CONFIG'
+
+# Each environment variable with this prefix sets one configuration value, e.g. OPENDATABLEND_CONFIG_BUCKET_NAME sets "bucket_name"
+environment_config_prefix = 'OPENDATABLEND_CONFIG_'
+
+
+# Writes one JSON object per line so that the progress of a run can be read by another program
+class JsonLinesWriter:
+    def __init__(self, output):
+        self.output = output
+        self._lock = threading.Lock()
+
+    def write(self, event, **values):
+        with self._lock:
+            self.output.write(json.dumps(dict(event=event, **values), default=str) + '\n')
+            self.output.flush()
+
+    # A metrics hook that writes a line as each data file is transferred
+    def __call__(self, metrics):
+        self.write('transfer', resource_name=metrics.resource_name, file_system=metrics.file_system, data_file_name=metrics.data_file_name, bytes=metrics.bytes_transferred, seconds=round(metrics.seconds, 3), cache_hit=metrics.cache_hit, error=str(metrics.error) if metrics.error is not None else None)
+
+
+# Parse a configuration value from the environment, which may be JSON such as a number, or a plain string
+def parse_environment_value(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+# Get the storage configuration from a JSON file, if one is given, overlaid with any values set in the environment
+def get_configuration(config_file_name=None):
+    configuration = {}
+
+    config_file_name = config_file_name or os.environ.get(environment_config_file)
+    if config_file_name:
+        with open(config_file_name) as config_file:
+            configuration.update(json.load(config_file))
+
+    for name, value in os.environ.items():
+        if name.startswith(environment_config_prefix):
+            configuration[name[len(environment_config_prefix):].lower()] = parse_environment_value(value)
+
+    return configuration
+
+
+# Get the manifest entries for the command. A manifest entry that doesn't set a value takes it from the command line or the environment.
+def get_manifest(args, configuration):
+    defaults = {
+        "base_path": args.base_path or os.environ.get(environment_base_path, '/'),
+        "access_key": args.access_key if args.access_key is not None else os.environ.get(environment_access_key, ''),
+        "file_system": args.file_system or os.environ.get(environment_file_system, 'local'),
+        "refresh": args.refresh,
+        "convert_to_parquet": args.convert_to_parquet
+    }
+
+    if args.command == 'sync':
+        with open(args.manifest) as manifest_file:
+            entries = json.load(manifest_file)
+    else:
+        entries = [{"dataset_path": args.dataset_path, "resource_names": args.resource_names}]
+
+    manifest = []
+    for entry in entries:
+        manifest_entry = dict(defaults, **entry)
+        manifest_entry["configuration"] = dict(configuration, **entry.get("configuration", {}))
+        manifest.append(manifest_entry)
+
+    return manifest
+
+
+def write_plan(writer, summary):
+    for transfer in summary.transfers:
+        writer.write('plan', dataset_path=transfer.dataset_path, resource_name=transfer.resource_name, file_system=transfer.file_system, data_file_name=transfer.data_file_name, size=transfer.size, cached=transfer.cached, transfer=transfer.error is None and not transfer.cached, error=str(transfer.error) if transfer.error is not None else None)
+
+    planned = [transfer for transfer in summary.transfers if transfer.error is None and not transfer.cached]
+    writer.write('summary', transfers=len(planned), bytes=sum(transfer.size or 0 for transfer in planned), failed=len(summary.failed), dry_run=True)
+
+    return 1 if summary.failed else 0
+
+
+def run_get(args, writer, configuration):
+    manifest = get_manifest(args, configuration)
+
+    if args.dry_run:
+        return write_plan(writer, plan_sync(manifest, args.workers))
+
+    entry = manifest[0]
+    output_set = get_data_files(entry["dataset_path"], entry["resource_names"], entry["base_path"], entry["access_key"], entry["file_system"], entry["configuration"], max_workers=args.workers, refresh=entry["refresh"], convert_to_parquet=entry["convert_to_parquet"], raise_errors=False)
+
+    writer.write('summary', data_file_names=output_set.data_file_names, metadata_file_name=output_set.metadata_file_name, succeeded=len(entry["resource_names"]) - len(output_set.errors), failed=len(output_set.errors))
+
+    return 1 if output_set.errors else 0
+
+
+def run_sync(args, writer, configuration):
+    manifest = get_manifest(args, configuration)
+
+    if args.dry_run:
+        return write_plan(writer, plan_sync(manifest, args.workers))
+
+    summary = sync(manifest, args.workers, args.workers_per_host, args.workers_per_backend)
+
+    writer.write('summary', metadata_file_names=summary.metadata_file_names, succeeded=len(summary.succeeded), failed=len(summary.failed), seconds=round(summary.seconds, 3))
+
+    return 1 if summary.failed else 0
+
+
+def run_ls_cache(args, writer, configuration):
+    base_path = args.base_path or os.environ.get(environment_base_path, '/')
+
+    for cached_data_file in list_cached(base_path):
+        writer.write('cached_data_file', **vars(cached_data_file))
+
+    stats = cache_stats(base_path)
+    writer.write('summary', file_count=stats.file_count, total_bytes=stats.total_bytes, bytes_per_dataset=stats.bytes_per_dataset)
+
+    return 0
+
+
+# Check that the cached data files match the dataset metadata, and download the ones that don't again if --repair is given
+def run_verify(args, writer, configuration):
+    verification = verify_cache(args.dataset_path, args.resource_names or None, args.base_path or os.environ.get(environment_base_path, '/'), args.access_key if args.access_key is not None else os.environ.get(environment_access_key, ''), args.file_system or os.environ.get(environment_file_system, 'local'), configuration, args.workers, args.repair, not args.size_only, args.convert_to_parquet)
+
+    for data_file in verification.data_files:
+        writer.write('verify', dataset_path=args.dataset_path, resource_name=data_file.resource_name, data_file_name=data_file.data_file_name, status=data_file.status, method=data_file.method, expected_size=data_file.expected_size, size=data_file.size, repaired=data_file.repaired, error=str(data_file.error) if data_file.error is not None else None)
+
+    unrepaired = [data_file for data_file in verification.invalid if not data_file.repaired]
+    writer.write('summary', checked=len(verification.data_files), invalid=len(verification.invalid), repaired=len(verification.invalid) - len(unrepaired), seconds=round(verification.seconds, 3))
+
+    return 1 if unrepaired else 0
+
+
+def add_destination_arguments(parser):
+    parser.add_argument('--base-path', help=f"The base path to cache data files under. Defaults to ${environment_base_path} or '/'.")
+    parser.add_argument('--access-key', help=f"The Open Data Blend access key. Defaults to ${environment_access_key}.")
+    parser.add_argument('--file-system', help=f"The file system to cache data files in. Defaults to ${environment_file_system} or 'local'.")
+    parser.add_argument('--config', help=f"A JSON file with the file system configuration. Defaults to ${environment_config_file}. Values can also be set with {environment_config_prefix}<NAME> environment variables.")
+    parser.add_argument('--workers', type=int, default=default_sync_max_workers, help="The number of data files to transfer at once.")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='opendatablend', description="Get data from the Open Data Blend Dataset API. Progress is written to standard output as one JSON object per line.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    get_parser = subparsers.add_parser('get', help="Get and cache data files from one dataset.")
+    get_parser.add_argument('dataset_path')
+    get_parser.add_argument('resource_names', nargs='+')
+    add_destination_arguments(get_parser)
+
+    sync_parser = subparsers.add_parser('sync', help="Get and cache the data files listed in a JSON manifest, which takes the same entries as the sync function.")
+    sync_parser.add_argument('manifest')
+    add_destination_arguments(sync_parser)
+    sync_parser.add_argument('--workers-per-host', type=int, default=default_sync_max_workers_per_host)
+    sync_parser.add_argument('--workers-per-backend', type=int, default=default_sync_max_workers_per_backend)
+
+    for transfer_parser in (get_parser, sync_parser):
+        transfer_parser.add_argument('--refresh', action='store_true', help="Download data files that no longer match the dataset metadata.")
+        transfer_parser.add_argument('--convert-to-parquet', action='store_true', help="Convert CSV data files to Parquet files as they are cached.")
+        transfer_parser.add_argument('--dry-run', action='store_true', help="List the data files that would be transferred, and their sizes, without transferring them.")
+
+    ls_cache_parser = subparsers.add_parser('ls-cache', help="List the data files cached in the local file system.")
+    ls_cache_parser.add_argument('--base-path', help=f"The base path of the local cache. Defaults to ${environment_base_path} or '/'.")
+
+    verify_parser = subparsers.add_parser('verify', help="Check that cached data files match the sizes and hashes in the dataset metadata.")
+    verify_parser.add_argument('dataset_path')
+    verify_parser.add_argument('resource_names', nargs='*', help="The resources to check. Defaults to every resource in the dataset that has been cached.")
+    add_destination_arguments(verify_parser)
+    verify_parser.add_argument('--repair', action='store_true', help="Download the data files that don't match, or that are missing from the resources named, again.")
+    verify_parser.add_argument('--size-only', action='store_true', help="Only compare sizes when the file system doesn't hold a checksum for a data file, rather than reading it back.")
+    verify_parser.add_argument('--convert-to-parquet', action='store_true', help="Check the Parquet files that CSV data files were converted to.")
+
+    return parser
+
+
+commands = {
+    'get': run_get,
+    'sync': run_sync,
+    'ls-cache': run_ls_cache,
+    'verify': run_verify
+}
+
+
+# Run the opendatablend command. Returns 0 if every data file succeeded and 1 otherwise.
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+
+    writer = JsonLinesWriter(sys.stdout)
+    add_metrics_hook(writer)
+
+    try:
+        # Messages printed while the data files are transferred go to standard error so that standard output only holds JSON
+        with redirect_stdout(sys.stderr):
+            configuration = get_configuration(getattr(args, 'config', None))
+            return commands[args.command](args, writer, configuration)
+    finally:
+        remove_metrics_hook(writer)
@@ -0,0 +1,103 @@
+import io
+from opendatablend.api import get_session
+from opendatablend.metrics import TransferMetrics
+from opendatablend.schema import import_pyarrow, get_data_file_format, get_arrow_column_types
+from opendatablend.storage import ChunkReader, get_source_metadata, default_chunk_size, cache_metadata_converted_from, cache_metadata_compression
+
+# CSV data files are converted to Parquet files with row groups of this many rows, compressed with this codec
+default_row_group_size = 250000
+default_parquet_compression = 'snappy'
+
+# String columns with no more than this share of distinct values in the first block of rows are stored as categoricals
+default_categorical_ratio = 0.5
+
+
+def is_convertible_data_file(data_file):
+    return get_data_file_format(data_file) == 'csv'
+
+
+# Get the name of the Parquet file that a CSV data file is converted to. The CSV extension is kept so that the name can't collide with the Parquet resource published alongside the CSV one.
+def get_converted_file_name(data_file_name):
+    return data_file_name + '.parquet'
+
+
+# Choose the string columns to store as categoricals from how often their values repeat in the first block of rows
+def get_categorical_columns(pyarrow, table, categorical_ratio):
+    if table.num_rows == 0:
+        return []
+
+    return [name for name, column in zip(table.column_names, table.columns) if pyarrow.types.is_string(column.type) and pyarrow.compute.count_distinct(column).as_py() <= table.num_rows * categorical_ratio]
+
+
+def encode_categorical_columns(pyarrow, table, categorical_columns):
+    for name in categorical_columns:
+        index = table.schema.get_field_index(name)
+        table = table.set_column(index, name, pyarrow.compute.dictionary_encode(table.column(index)))
+
+    return table
+
+
+# Group the blocks of rows parsed from a CSV into tables of row_group_size rows, so that each row group is written in one go
+def iter_row_groups(pyarrow, csv_reader, row_group_size, categorical_ratio):
+    categorical_columns = None
+    pending = []
+    pending_rows = 0
+
+    for batch in csv_reader:
+        table = pyarrow.Table.from_batches([batch])
+
+        if categorical_columns is None:
+            categorical_columns = get_categorical_columns(pyarrow, table, categorical_ratio)
+
+        pending.append(encode_categorical_columns(pyarrow, table, categorical_columns))
+        pending_rows += table.num_rows
+
+        if pending_rows >= row_group_size:
+            yield pyarrow.concat_tables(pending)
+            pending = []
+            pending_rows = 0
+
+    if pending:
+        yield pyarrow.concat_tables(pending)
+
+
+# Stream a CSV data file from a URL, parse it using the types declared in its schema and write it to the file system as a Parquet file. The conversion is recorded in the metadata stored with the file.
+def convert_csv_to_parquet(backend, file_name, url, data_file, metadata=None, metrics=None, row_group_size=default_row_group_size, compression=default_parquet_compression, categorical_ratio=default_categorical_ratio):
+    pyarrow = import_pyarrow()
+
+    if metrics is None:
+        metrics = TransferMetrics()
+
+    with get_session().get(url, stream=True) as response:
+        response.raise_for_status()
+
+        parquet_metadata = get_source_metadata(metadata, response.headers)
+        parquet_metadata[cache_metadata_converted_from] = 'csv'
+        parquet_metadata[cache_metadata_compression] = compression
+
+        # The CSV is checked against the dataset metadata as it is parsed, before the Parquet file is completed
+        validator = backend.get_validator(metadata)
+        input_file = io.BufferedReader(ChunkReader(validator.iter_chunks(metrics.iter_download(response.iter_content(chunk_size=default_chunk_size)))), buffer_size=default_chunk_size)
+        read_options = pyarrow.csv.ReadOptions(block_size=default_chunk_size)
+        convert_options = pyarrow.csv.ConvertOptions(column_types=get_arrow_column_types(pyarrow, data_file))
+        csv_reader = pyarrow.csv.open_csv(input_file, read_options=read_options, convert_options=convert_options)
+
+        with backend.open_write(file_name, parquet_metadata) as output_file:
+            parquet_writer = None
+
+            for table in iter_row_groups(pyarrow, csv_reader, row_group_size, categorical_ratio):
+                if parquet_writer is None:
+                    parquet_writer = pyarrow.parquet.ParquetWriter(output_file, table.schema, compression=compression)
+
+                with metrics.phase('upload'):
+                    parquet_writer.write_table(table, row_group_size=row_group_size)
+
+            # A CSV data file with no rows still produces a Parquet file with its columns
+            if parquet_writer is None:
+                parquet_writer = pyarrow.parquet.ParquetWriter(output_file, csv_reader.schema, compression=compression)
+
+            validator.validate(file_name)
+
+            with metrics.phase('upload'):
+                parquet_writer.close()
+                output_file.close()
@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from opendatablend.api import get_session
+
+# How long a cached dataset metadata file is trusted before it is revalidated with the server, in seconds
+default_metadata_ttl = 300
+
+# The maximum number of dataset metadata files to hold in memory before the least recently used is evicted
+default_metadata_max_entries = 64
+
+
+class MetadataCacheEntry:
+    def __init__(self, content, etag, last_modified, fetched_at):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+
+class MetadataCache:
+    def __init__(self, ttl=default_metadata_ttl, max_entries=default_metadata_max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._url_locks = {}
+
+    # Get the content of a metadata file, only going to the server when the cached copy has expired. A ttl of None means the cached copy never expires, which suits versioned snapshot files.
+    def get_content(self, url, ttl=-1):
+        if ttl == -1:
+            ttl = self.ttl
+
+        # Only allow one thread to fetch a given file at a time so a batch costs a single round trip
+        with self._get_url_lock(url):
+            entry = self._get_entry(url)
+
+            if entry is not None and (ttl is None or time.monotonic() - entry.fetched_at < ttl):
+                return entry.content
+
+            headers = {}
+            if entry is not None:
+                # Ask the server to confirm that the cached copy is still current
+                if entry.etag:
+                    headers['If-None-Match'] = entry.etag
+                if entry.last_modified:
+                    headers['If-Modified-Since'] = entry.last_modified
+
+            response = get_session().get(url, headers=headers)
+
+            if entry is not None and response.status_code == 304:
+                entry.fetched_at = time.monotonic()
+                return entry.content
+
+            response.raise_for_status()
+
+            entry = MetadataCacheEntry(response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'), time.monotonic())
+            self._set_entry(url, entry)
+
+            return entry.content
+
+    # Get the dataset metadata as a frictionless package
+    def get_package(self, dataset_path):
+        # The frictionless library is slow to import, so it is only imported once dataset metadata is needed
+        from frictionless import Package
+
+        # Local dataset metadata files are cheap to read so they are not cached
+        if not dataset_path.startswith('http'):
+            return Package(dataset_path)
+
+        descriptor = json.loads(self.get_content(dataset_path))
+
+        return Package(descriptor, basepath=dataset_path.rsplit('/', 1)[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._url_locks.clear()
+
+    def _get_url_lock(self, url):
+        with self._lock:
+            if url not in self._url_locks:
+                self._url_locks[url] = threading.Lock()
+            return self._url_locks[url]
+
+    def _get_entry(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def _set_entry(self, url, entry):
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+
+            # Evict the least recently used metadata files
+            while len(self._entries) > self.max_entries:
+                evicted_url, _ = self._entries.popitem(last=False)
+                self._url_locks.pop(evicted_url, None)
+
+
+# The metadata cache shared by every function in the process
+metadata_cache = MetadataCache()
+
+
+def get_dataset(dataset_path):
+    return metadata_cache.get_package(dataset_path)
+
+
+def get_dataset_metadata_content(metadata_file_path):
+    # Snapshot files are versioned so they never change once they have been published
+    return metadata_cache.get_content(metadata_file_path, ttl=None)
+
+
+def clear_metadata_cache():
+    metadata_cache.clear()
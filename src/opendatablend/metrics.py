@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger('opendatablend')
+
+
+# Records where the time went while caching one data file
+class TransferMetrics:
+    def __init__(self, resource_name='', file_system='', data_file_name=''):
+        self.resource_name = resource_name
+        self.file_system = file_system
+        self.data_file_name = data_file_name
+        # Seconds spent in each phase, such as 'descriptor', 'exists_check', 'lock_wait', 'resolve', 'download', 'upload' and 'copy'
+        self.phases = {}
+        self.bytes_transferred = 0
+        # True if the data file was already cached, False if it was transferred and None if it failed before this was known
+        self.cache_hit = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add_phase_time(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_bytes(self, count):
+        with self._lock:
+            self.bytes_transferred += count
+
+    @contextmanager
+    def phase(self, phase):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(phase, time.perf_counter() - start_time)
+
+    # Iterate over chunks, timing how long each one takes to arrive and counting the bytes
+    def iter_download(self, chunks):
+        iterator = iter(chunks)
+        while True:
+            start_time = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                self.add_phase_time('download', time.perf_counter() - start_time)
+                return
+            self.add_phase_time('download', time.perf_counter() - start_time)
+            self.add_bytes(len(chunk))
+            yield chunk
+
+    @property
+    def seconds(self):
+        return sum(self.phases.values())
+
+    @property
+    def transfer_seconds(self):
+        return sum(self.phases.get(phase, 0.0) for phase in ('download', 'upload', 'copy'))
+
+    # The transfer rate in bytes per second, or None if nothing was transferred
+    @property
+    def throughput(self):
+        if self.bytes_transferred == 0 or self.transfer_seconds == 0:
+            return None
+        return self.bytes_transferred / self.transfer_seconds
+
+
+metrics_hooks = []
+
+
+# Register a callback that is called with the TransferMetrics of every data file once it has been cached or has failed
+def add_metrics_hook(hook):
+    metrics_hooks.append(hook)
+
+
+def remove_metrics_hook(hook):
+    metrics_hooks.remove(hook)
+
+
+def emit_metrics(metrics):
+    for hook in list(metrics_hooks):
+        try:
+            hook(metrics)
+        except Exception as ex:
+            # A broken hook must not fail the transfer it is reporting on
+            logger.warning(f"The metrics hook {hook!r} failed: {ex}")
+
+
+# A metrics hook that writes one log record per data file
+class LoggingMetricsHook:
+    def __init__(self, logger=logger, level=logging.INFO):
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, metrics):
+        if metrics.error is not None:
+            self.logger.warning(f"resource={metrics.resource_name} file_system={metrics.file_system} error={metrics.error}")
+            return
+
+        throughput = f"{metrics.throughput:.0f}" if metrics.throughput is not None else "-"
+        phases = " ".join(f"{phase}={seconds:.3f}" for phase, seconds in sorted(metrics.phases.items()))
+        self.logger.log(self.level, f"resource={metrics.resource_name} file_system={metrics.file_system} cache_hit={metrics.cache_hit} bytes={metrics.bytes_transferred} throughput={throughput} {phases}")
+
+
+# A metrics hook that keeps running totals in the style of Prometheus counters
+class MetricsCounters:
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def __call__(self, metrics):
+        if metrics.error is not None:
+            result = 'error'
+        elif metrics.cache_hit:
+            result = 'hit'
+        else:
+            result = 'miss'
+
+        with self._lock:
+            self.counters[('opendatablend_transfers_total', (('file_system', metrics.file_system), ('result', result)))] += 1
+            self.counters[('opendatablend_transferred_bytes_total', (('file_system', metrics.file_system),))] += metrics.bytes_transferred
+            for phase, seconds in metrics.phases.items():
+                self.counters[('opendatablend_phase_seconds_total', (('file_system', metrics.file_system), ('phase', phase)))] += seconds
+
+    def get(self, name, **labels):
+        with self._lock:
+            return self.counters.get((name, tuple(sorted(labels.items()))), 0.0)
+
+    # Render the counters in the Prometheus text exposition format
+    def to_prometheus_text(self):
+        with self._lock:
+            lines = []
+            for (name, labels), value in sorted(self.counters.items()):
+                label_text = ",".join(f'{key}="{label_value}"' for key, label_value in labels)
+                lines.append(f"{name}{{{label_text}}} {value:g}")
+            return "\n".join(lines) + "\n"
@@ -1,385 +1,273 @@
-import os
-import errno
-from io import BytesIO
-from frictionless import Package
-import requests
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient, __version__
-import boto3
-from botocore.client import ClientError
-from google.cloud import storage
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from opendatablend.api import get_session, get_download_path, concurrency_limiter
+from opendatablend.metadata import get_dataset, get_dataset_metadata_content
+from opendatablend.metrics import TransferMetrics, emit_metrics, logger
+from opendatablend.cache_index import record_local_data_file
+from opendatablend.convert import is_convertible_data_file, get_converted_file_name, convert_csv_to_parquet
+from opendatablend.storage import LocalStorageBackend, storage_backends, get_storage_backend, get_source_metadata, is_cached_file_current, cache_metadata_bytes, cache_metadata_hash, cache_metadata_content_encoding
 
 # Open Data Blend API base URL
 base_url = 'https://packages.opendatablend.io'
 base_url_local_substitution = 'opendatablend'
 
 class Output:
-    def __init__(self, data_file_name, metadata_file_name):
+    def __init__(self, data_file_name, metadata_file_name, metrics=None):
         self.data_file_name = data_file_name
         self.metadata_file_name = metadata_file_name
+        # The phase timings, bytes transferred and cache hit or miss for the data file
+        self.metrics = metrics
 
 class OutputSet:
-    def __init__(self, data_file_names, metadata_file_name,):
+    def __init__(self, data_file_names, metadata_file_name, timings=None, errors=None, metrics=None):
         self.data_file_names = data_file_names
         self.metadata_file_name = metadata_file_name
+        # Per-resource download timings in seconds and any errors that stopped a resource from being cached
+        self.timings = timings if timings is not None else {}
+        self.errors = errors if errors is not None else {}
+        # Per-resource transfer metrics
+        self.metrics = metrics if metrics is not None else {}
 
 # Get and cache a data file and the dataset metadata
-def get_data(dataset_path, resource_name, base_path='/', access_key='', file_system='local', configuration={}):
-    # Get the dataset metadata
-    dataset = Package(dataset_path)
+def get_data(dataset_path, resource_name, base_path='/', access_key='', file_system='local', configuration={}, refresh=False, convert_to_parquet=False):
+    metrics = TransferMetrics(resource_name, file_system)
 
-    # Get the data file metadata
-    data_file = dataset.get_resource(resource_name)
+    try:
+        # Get the dataset metadata
+        with metrics.phase('descriptor'):
+            dataset = get_dataset(dataset_path)
 
-    # Set the fully qualified data file name to mirror the logical folder structure at the server
-    data_file_name = base_path + data_file.path.replace(base_url, base_url_local_substitution)
+        # Cache the data file in the specified file system
+        output_data_file_name = cache_resource(dataset, resource_name, base_path, access_key, file_system, configuration, refresh, metrics, convert_to_parquet)
+    except Exception as ex:
+        metrics.error = ex
+        emit_metrics(metrics)
+        raise
 
-    # Cache the file in the specified file system
-    output_data_file_name = cache_date_file(data_file, data_file_name, access_key, file_system, configuration)
+    emit_metrics(metrics)
 
     # Save a copy of the dataset metadata to the specific file system
+    output_metadata_file_name = ''
     if dataset_path.startswith('http'):
         output_metadata_file_name = cache_dataset_metadata(dataset, base_path, file_system, configuration)
 
-    output = Output(output_data_file_name, output_metadata_file_name)
+    output = Output(output_data_file_name, output_metadata_file_name, metrics)
 
     # Return the output object which contains the fully qualified file names
     return output
 
 
-def cache_date_file(data_file, data_file_name, access_key, file_system, configuration):
-    if file_system == "local":
-        output_data_file_name = cache_data_file_to_local_file_system(data_file, access_key, data_file_name)
-    elif file_system == "azure_blob_storage":
-        output_data_file_name = cache_data_file_to_azure_blob_storage_file_system(data_file, access_key, data_file_name, configuration)
-    elif file_system == "amazon_s3":
-        output_data_file_name = cache_data_file_to_amazon_s3_file_system(data_file, access_key, data_file_name, configuration)
-    elif file_system == "google_cloud_storage":
-        output_data_file_name = cache_data_file_to_google_cloud_storage_file_system(data_file, access_key, data_file_name, configuration)
-    else:
-        print("No data file could be cached. Please specify a supported file system.")
-        output_data_file_name = ''
-
-    return output_data_file_name
-
+# Cache a single data file from an already loaded dataset
+def cache_resource(dataset, resource_name, base_path, access_key, file_system, configuration, refresh=False, metrics=None, convert_to_parquet=False):
+    # Get the data file metadata
+    data_file = dataset.get_resource(resource_name)
 
-def cache_data_file_to_local_file_system(data_file, access_key, data_file_name):
-    # Create the directory for the data file if it doesn't exist
-    if not os.path.exists(os.path.dirname(data_file_name)):
-        try:
-            os.makedirs(os.path.dirname(data_file_name))
-        except OSError as ex:
-            if ex.errno != errno.EEXIST:
-                raise
-
-    # Only download the data file if it doesn't exist
-    if not os.path.exists(data_file_name):
-        if access_key != '':
-            data_file_download_path = data_file.path + '?accesskey=' + access_key
-        else:
-            data_file_download_path = data_file.path  
-        
-        with requests.get(data_file_download_path, stream=True) as data:
-
-            # Download the data file using a 4 MB chunk size
-            with open(data_file_name,'wb') as local_file:
-                for chunk in data.iter_content(chunk_size=4 * 1024 * 1024):
-                    local_file.write(chunk)            
+    # Cache the file in the specified file system
+    return cache_date_file(data_file, get_data_file_name(data_file, base_path), access_key, file_system, configuration, refresh, metrics, convert_to_parquet, base_path)
 
-    # Return the data file name at the relative path so it can be used
-    return data_file_name
 
+# Set the fully qualified data file name to mirror the logical folder structure at the server
+def get_data_file_name(data_file, base_path):
+    return base_path + data_file.path.replace(base_url, base_url_local_substitution)
 
-def cache_data_file_to_azure_blob_storage_file_system(data_file, access_key, data_file_name, configuration):
-    # Get the Azure Blob Storage configurations
-    connection_string =  configuration["connection_string"]
-    container_name = configuration["container_name"]
 
-    # Create the blob client
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+# Get the size and hash that the dataset metadata declares for a data file, in the form they are stored with the cached file
+def get_data_file_cache_metadata(data_file, content_encoding=None):
+    stats = data_file.get('stats') or {}
 
-    # Create the blob container if it doesn't exist
-    container_client = blob_service_client.get_container_client(container_name)
-    if not container_client.exists():
-        container_client.create_container()
+    # Older versions of the frictionless library keep the size and hash at the top level of the resource
+    data_file_bytes = data_file.get('bytes', stats.get('bytes'))
+    data_file_hash = data_file.get('hash', stats.get('hash'))
 
-    # Remove the leading slash
-    output_data_file_name = data_file_name.replace("/opendatablend","opendatablend")
+    cache_metadata = {}
+    if data_file_bytes is not None:
+        cache_metadata[cache_metadata_bytes] = str(data_file_bytes)
+    if data_file_hash:
+        cache_metadata[cache_metadata_hash] = str(data_file_hash)
 
-    # Only upload the data file if it doesn't exist
-    blob_client = container_client.get_blob_client(output_data_file_name)
+    # A data file that is to be compressed records its encoding, which tells the file system to compress it as it is written
+    if content_encoding is not None:
+        cache_metadata[cache_metadata_content_encoding] = content_encoding
 
-    if not blob_client.exists():
-        if access_key != '':
-            data_file_download_path = data_file.path + '?accesskey=' + access_key
-        else:
-            data_file_download_path = data_file.path  
+    return cache_metadata
 
-        response = requests.get(data_file_download_path)
 
-        blob_client.upload_blob_from_url(response.url)
+# Get the name a data file is cached under in a file system, whether it is converted as it is cached and the encoding it is compressed with, if any. CSV data files can be converted to Parquet files.
+def get_cached_data_file_name(backend, data_file, data_file_name, convert_to_parquet=False):
+    convert = convert_to_parquet and is_convertible_data_file(data_file)
+    if convert:
+        data_file_name = get_converted_file_name(data_file_name)
 
-    # Return the data file name at the relative path so it can be used    
-    return output_data_file_name
+    # Whether to compress the data file is decided from its own name, before any extension for the encoding is added
+    content_encoding = backend.get_content_encoding(data_file_name)
 
+    return backend.get_encoded_file_name(backend.get_output_file_name(data_file_name), content_encoding), convert, content_encoding
 
-def cache_data_file_to_amazon_s3_file_system(data_file, access_key, data_file_name, configuration):
-    # Get the Amazon S3 bucket configurations
-    aws_access_key_id =  configuration["aws_access_key_id"]
-    aws_secret_access_key = configuration["aws_secret_access_key"]
-    bucket_name = configuration["bucket_name"]
-    bucket_region = configuration["bucket_region"]
 
-    # Create the s3 client resource
-    s3_client = boto3.client('s3', aws_access_key_id=aws_access_key_id, aws_secret_access_key=aws_secret_access_key)
+# Hold a lock while a data file is cached so that other processes requesting it wait and then reuse it rather than downloading it too. Another process may have cached the data file while this one was waiting, so the result of checking the cache again is yielded.
+@contextmanager
+def cache_lock(backend, output_data_file_name, metrics, check_cached):
+    lock = backend.lock(output_data_file_name)
+    with metrics.phase('lock_wait'):
+        lock.acquire()
 
-    # Create the bucket if it doesn't exist
     try:
-        s3_client.head_bucket(Bucket=bucket_name)
-        s3_bucket_exists = True
-    except ClientError:
-        s3_client.create_bucket(Bucket=bucket_name, CreateBucketConfiguration={'LocationConstraint': bucket_region})
-        
-        # If the bucket does not exist then the data file does not exist
-        s3_bucket_exists = False
+        with metrics.phase('exists_check'):
+            result = check_cached()
+        yield result
+    finally:
+        lock.release()
 
-    # Remove the leading slash
-    output_data_file_name = data_file_name.replace("/opendatablend","opendatablend")
 
-    s3_resource = boto3.resource('s3', aws_access_key_id=aws_access_key_id, aws_secret_access_key=aws_secret_access_key)
-
-    s3_object_exists = False
-
-    # Check if the data file exists only if the bucket already existed, otherwise we know it doesn't exist
-    if s3_bucket_exists:
-        try:
-            s3_resource.Object(bucket_name, output_data_file_name).load()
-            s3_object_exists = True
-        except ClientError as e:
-            if e.response['Error']['Code'] == "404":
-                # The object doesn't exist so the data file needs to be uploaded
-                s3_object_exists = False
-            else:
-                # Something else has gone wrong so we need to throw the error
-                raise
+# Move the bytes of a data file into the file system, converting it as they arrive if it is to be converted
+def transfer_data_file(backend, output_data_file_name, data_file_download_path, data_file, cache_metadata, metrics, convert):
+    if convert:
+        convert_csv_to_parquet(backend, output_data_file_name, data_file_download_path, data_file, cache_metadata, metrics)
     else:
-        s3_object_exists = False
-
-    # Only upload the data file if it doesn't exist
-    if not s3_object_exists:
-        if access_key != '':
-            data_file_download_path = data_file.path + '?accesskey=' + access_key
-        else:
-            data_file_download_path = data_file.path  
-
-        with requests.get(data_file_download_path, stream=True) as data:
-            with data as part:
-                part.raw.decode_content = True
-                conf = boto3.s3.transfer.TransferConfig(multipart_threshold=10000, max_concurrency=4)
-                s3_client.upload_fileobj(part.raw, bucket_name, output_data_file_name, Config=conf)
-    
-    # Return the data file name at the relative path so it can be used
-    return output_data_file_name
-
-
-def cache_data_file_to_google_cloud_storage_file_system(data_file, access_key, data_file_name, configuration):
-    # Get the Google Cloud Storage configurations
-    service_account_private_key_file =  configuration["service_account_private_key_file"]
-    bucket_name = configuration["bucket_name"]
-    bucket_location = configuration["bucket_location"]
+        backend.upload_from_url(output_data_file_name, data_file_download_path, cache_metadata, metrics)
 
-    # Create the storage client
-    storage_client = storage.Client.from_service_account_json(service_account_private_key_file)
 
-    # Create the bucket if it doesn't exist
-    bucket = storage_client.bucket(bucket_name)
-    if not bucket.exists():
-        bucket.storage_class = 'STANDARD'
-        storage_client.create_bucket(bucket, location=bucket_location)
+# Keep the index of the local cache up to date so it can be listed and trimmed
+def record_cached_data_file(backend, base_path, data_file, output_data_file_name, data_file_hash, cache_hit, configuration):
+    if isinstance(backend, LocalStorageBackend) and base_path is not None:
+        record_local_data_file(base_path, data_file, output_data_file_name, data_file_hash, cache_hit, configuration)
 
-    # Remove the leading slash
-    output_data_file_name = data_file_name.replace("/opendatablend","opendatablend")
 
-    blob = bucket.blob(output_data_file_name)
+# Cache a data file unless it is already cached. Set force to download it again even if it is.
+def cache_date_file(data_file, data_file_name, access_key, file_system, configuration, refresh=False, metrics=None, convert_to_parquet=False, base_path=None, force=False):
+    if file_system not in storage_backends:
+        raise ValueError(f"The file system '{file_system}' is not supported.")
 
-    # Only upload the data file if it doesn't exist
-    if not blob.exists():
-        if access_key != '':
-            data_file_path = data_file.path + '?accesskey=' + access_key
-        else:
-            data_file_path = data_file.path   
-
-        # Note: The entire content is written to memory before being streamed to the destination blob. This is due to a limitation around getting the response as a stream and writing it directly.
-        with BytesIO(requests.get(data_file_path).content) as data:
-              blob.upload_from_file(data)
-
-    # Return the data file name at the relative path so it can be used  
-    return output_data_file_name  
-
-
-def cache_dataset_metadata(dataset, base_path, file_system, configuration):
-    metadata_data_file_snapshot_path = dataset.get('snapshot_path')
+    backend = get_storage_backend(file_system, configuration)
 
-    # Set the fully qualified metadata file name to mirror the logical folder structure at the server
-    metadata_file_name = base_path + metadata_data_file_snapshot_path.replace(base_url, base_url_local_substitution)
+    if metrics is None:
+        metrics = TransferMetrics()
 
-    if file_system == "local":
-        output_metadata_file_name = cache_dataset_metadata_to_local_file_system(metadata_data_file_snapshot_path, metadata_file_name)
-    elif file_system == "azure_blob_storage":
-        output_metadata_file_name = cache_dataset_metadata_to_azure_blob_storage_file_system(metadata_data_file_snapshot_path, metadata_file_name, configuration)
-    elif file_system == "amazon_s3":
-        output_metadata_file_name = cache_dataset_metadata_to_amazon_s3_file_system(metadata_data_file_snapshot_path, metadata_file_name, configuration)
-    elif file_system == "google_cloud_storage":
-        output_metadata_file_name = cache_dataset_metadata_to_google_cloud_storage_file_system(metadata_data_file_snapshot_path, metadata_file_name, configuration)        
-    else:
-        print("No metadata file could be cached. Please specify a supported file system.")
-        output_metadata_file_name = ''
-    return output_metadata_file_name
+    output_data_file_name, convert, content_encoding = get_cached_data_file_name(backend, data_file, data_file_name, convert_to_parquet)
+    data_file_download_path = get_download_path(data_file, access_key)
+    metrics.data_file_name = output_data_file_name
 
+    def check_cached():
+        if force:
+            return False, get_data_file_cache_metadata(data_file, content_encoding)
+        return check_cached_data_file(backend, output_data_file_name, data_file, data_file_download_path, refresh, content_encoding)
 
-def cache_dataset_metadata_to_local_file_system(metadata_data_file_snapshot_path, metadata_file_name):
-    # Create the directory for the dataset metadata file if it doesn't exist
-    if not os.path.exists(os.path.dirname(metadata_file_name)):
-        try:
-            os.makedirs(os.path.dirname(metadata_file_name))
-        except OSError as ex:
-            if ex.errno != errno.EEXIST:
-                raise
+    with metrics.phase('exists_check'):
+        is_cached, cache_metadata = check_cached()
 
-    # Download the dataset metadata file if it doesn't exist
-    if not os.path.exists(metadata_file_name):
-        data = requests.get(metadata_data_file_snapshot_path)
+    if not is_cached:
+        with cache_lock(backend, output_data_file_name, metrics, check_cached) as (is_cached, cache_metadata):
+            if not is_cached:
+                # Transfers wait for a slot so fewer run at once while the API is throttling requests
+                with concurrency_limiter.slot():
+                    transfer_data_file(backend, output_data_file_name, data_file_download_path, data_file, cache_metadata, metrics, convert)
 
-        open(metadata_file_name, 'wb').write(data.content)
+    metrics.cache_hit = is_cached
+    record_cached_data_file(backend, base_path, data_file, output_data_file_name, cache_metadata.get(cache_metadata_hash), is_cached, configuration)
 
-    # Return the metadata file name at the relative path so it can be used
-    return metadata_file_name
+    # Return the data file name at the relative path so it can be used
+    return output_data_file_name
 
 
-def cache_dataset_metadata_to_azure_blob_storage_file_system(metadata_data_file_snapshot_path, metadata_file_name, configuration):
-    # Get the Azure Blob Storage configurations
-    connection_string =  configuration["connection_string"]
-    container_name = configuration["container_name"]
+# Check whether a data file needs to be downloaded. Returns the result along with the metadata to store with the data file.
+def check_cached_data_file(backend, output_data_file_name, data_file, data_file_download_path, refresh, content_encoding=None):
+    cache_metadata = get_data_file_cache_metadata(data_file)
 
-    # Create the blob client
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+    if refresh:
+        # Only download the data file if it doesn't exist or no longer matches the data file described in the dataset metadata
+        cached_file_info = backend.stat(output_data_file_name)
 
-    # Create the blob container if it doesn't exist
-    container_client = blob_service_client.get_container_client(container_name)
-    if not container_client.exists():
-        container_client.create_container()
+        if cached_file_info is not None and not cache_metadata:
+            # The dataset metadata doesn't describe the data file so ask the server for its validators instead
+            response = get_session().head(data_file_download_path, allow_redirects=True)
+            cache_metadata = get_source_metadata(None, response.headers)
 
-    # Remove the leading slash
-    output_metadata_file_name = metadata_file_name.replace("/opendatablend","opendatablend")
+        is_cached = is_cached_file_current(cached_file_info, cache_metadata)
+    else:
+        # Only download the data file if it doesn't exist
+        is_cached = backend.exists(output_data_file_name)
 
-    # Only upload the data file if it doesn't exist
-    blob_client = container_client.get_blob_client(output_metadata_file_name)
+    if content_encoding is not None:
+        cache_metadata[cache_metadata_content_encoding] = content_encoding
 
-    if not blob_client.exists():
-        with requests.get(metadata_data_file_snapshot_path, stream=True) as data:
-            blob_client.upload_blob(data)
+    return is_cached, cache_metadata
 
-    # Return the metadata file name at the relative path so it can be used
-    return output_metadata_file_name
 
+def cache_dataset_metadata(dataset, base_path, file_system, configuration):
+    metadata_data_file_snapshot_path = dataset.get('snapshot_path')
 
-def cache_dataset_metadata_to_amazon_s3_file_system(metadata_data_file_snapshot_path, metadata_file_name, configuration):
-    # Get the Amazon S3 bucket configurations
-    aws_access_key_id = configuration["aws_access_key_id"]
-    aws_secret_access_key = configuration["aws_secret_access_key"]
-    bucket_name = configuration["bucket_name"]
-    bucket_region = configuration["bucket_region"]
+    # Set the fully qualified metadata file name to mirror the logical folder structure at the server
+    metadata_file_name = base_path + metadata_data_file_snapshot_path.replace(base_url, base_url_local_substitution)
 
-    # Create the s3 client
-    s3_client = boto3.client('s3', aws_access_key_id=aws_access_key_id, aws_secret_access_key=aws_secret_access_key)
-    
-    s3_bucket_exists = False
+    if file_system not in storage_backends:
+        raise ValueError(f"The file system '{file_system}' is not supported.")
 
-    # Create the bucket if it doesn't exist
-    try:
-        s3_client.head_bucket(Bucket=bucket_name)
-        s3_bucket_exists = True
-    except ClientError:
-        s3_client.create_bucket(Bucket=bucket_name, CreateBucketConfiguration={'LocationConstraint': bucket_region})
-        
-        # If the bucket does not exist then the data file does not exist
-        s3_bucket_exists = False
+    backend = get_storage_backend(file_system, configuration)
 
-    # Remove the leading slash
-    output_metadata_file_name = metadata_file_name.replace("/opendatablend","opendatablend")
+    output_metadata_file_name = backend.get_output_file_name(metadata_file_name)
 
-    s3_resource = boto3.resource('s3', aws_access_key_id=aws_access_key_id, aws_secret_access_key=aws_secret_access_key)
+    # Only save the dataset metadata file if it doesn't exist
+    if not backend.exists(output_metadata_file_name):
+        backend.write_bytes(output_metadata_file_name, get_dataset_metadata_content(metadata_data_file_snapshot_path))
 
-    # Check if the metadata file exists only if the bucket already existed, otherwise we know it doesn't exist
-    if s3_bucket_exists:
-        try:
-            s3_resource.Object(bucket_name, output_metadata_file_name).load()
-            s3_object_exists = True
-        except ClientError as e:
-            if e.response['Error']['Code'] == "404":
-                # The object doesn't exist so the metadata file needs to be uploaded
-                s3_object_exists = False
-            else:
-                # Something else has gone wrong so we need to throw the error
-                raise
-    else:
-        s3_object_exists = False
-     
-    # Only upload the metadata file if it doesn't exist
-    if not s3_object_exists:
-        with requests.get(metadata_data_file_snapshot_path, stream=True) as data:
-            with data as part:
-                part.raw.decode_content = True
-                conf = boto3.s3.transfer.TransferConfig(multipart_threshold=10000, max_concurrency=4)
-                s3_client.upload_fileobj(part.raw, bucket_name, output_metadata_file_name, Config=conf)
-    
     # Return the metadata file name at the relative path so it can be used
     return output_metadata_file_name
 
 
-def cache_dataset_metadata_to_google_cloud_storage_file_system(metadata_data_file_snapshot_path, metadata_file_name, configuration):
-    # Get the Google Cloud Storage configurations
-    service_account_private_key_file =  configuration["service_account_private_key_file"]
-    bucket_name = configuration["bucket_name"]
-    bucket_location = configuration["bucket_location"]
-
-    # Create the storage client
-    if service_account_private_key_file != "":
-        # Attempt to load the credentials from the specified service account private key JSON file
-        storage_client = storage.Client.from_service_account_json(service_account_private_key_file)
-    else:
-        # Assume that the code is being executed within a Google Cloud environment and try to automatically pick up service account credentials
-        storage_client = storage.Client()
-
-    # Create the bucket if it doesn't exist
-    bucket = storage_client.bucket(bucket_name)
-    if not bucket.exists():
-        bucket.storage_class = 'STANDARD'
-        storage_client.create_bucket(bucket, location=bucket_location)
+# Get and cache a collection of data files and the dataset metadata, optionally downloading several data files at once
+# The first data file that fails to download raises its error. Set raise_errors to False to carry on with the rest of the batch and record the failures in the errors of the output instead.
+def get_data_files(dataset_path, resource_names, base_path='/', access_key='', file_system='local', configuration={}, max_workers=1, refresh=False, convert_to_parquet=False, raise_errors=True):
+    # Get the dataset metadata once for the whole batch
+    start_time = time.perf_counter()
+    dataset = get_dataset(dataset_path)
+    descriptor_seconds = time.perf_counter() - start_time
 
-    # Remove the leading slash
-    output_metadata_file_name = metadata_file_name.replace("/opendatablend","opendatablend")
+    data_file_names = [''] * len(resource_names)
+    timings = {}
+    errors = {}
+    metrics = {}
 
-    blob = bucket.blob(output_metadata_file_name)
+    def cache_timed_resource(resource_name):
+        # Every data file in the batch waited on the same dataset metadata
+        resource_metrics = TransferMetrics(resource_name, file_system)
+        resource_metrics.add_phase_time('descriptor', descriptor_seconds)
+        metrics[resource_name] = resource_metrics
 
-    # Only upload the data file if it doesn't exist
-    if not blob.exists():
-        with BytesIO(requests.get(metadata_data_file_snapshot_path).content) as data:
-              blob.upload_from_file(data)
-        
-    # Return the metadata file name at the relative path so it can be used
-    return output_metadata_file_name
-
-
-def get_data_files(dataset_path, resource_names, base_path='/', access_key='', file_system='local', configuration={}):
-    data_file_names = []    
-    for resource_name in resource_names:        
-        # Get data the and capture the output object
-        output = get_data(dataset_path=dataset_path, resource_name=resource_name, base_path=base_path, access_key=access_key, file_system=file_system, configuration=configuration)
-    
-        # Add data file name to the list of data file name
-        data_file_names.append(output.data_file_name)
-
-    outputSet = OutputSet(data_file_names, output.metadata_file_name)
+        start_time = time.perf_counter()
+        try:
+            return cache_resource(dataset, resource_name, base_path, access_key, file_system, configuration, refresh, resource_metrics, convert_to_parquet)
+        except Exception as ex:
+            resource_metrics.error = ex
+            raise
+        finally:
+            timings[resource_name] = time.perf_counter() - start_time
+            emit_metrics(resource_metrics)
+
+    # Cache the data files using a pool of worker threads. A max_workers value of 1 downloads the files one at a time.
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [executor.submit(cache_timed_resource, resource_name) for resource_name in resource_names]
+
+        for index, (resource_name, future) in enumerate(zip(resource_names, futures)):
+            try:
+                data_file_names[index] = future.result()
+            except Exception as ex:
+                if raise_errors:
+                    # Don't start the data files that are still waiting for a worker
+                    for pending_future in futures:
+                        pending_future.cancel()
+                    raise
+
+                # Record the failure and carry on so that one bad data file does not stop the rest of the batch
+                errors[resource_name] = ex
+                logger.warning(f"The data file for resource '{resource_name}' could not be cached: {ex}")
+
+    # Save a copy of the dataset metadata to the specific file system once all of the data files have been cached, if any were
+    metadata_file_name = ''
+    if dataset_path.startswith('http') and any(data_file_names):
+        metadata_file_name = cache_dataset_metadata(dataset, base_path, file_system, configuration)
+
+    outputSet = OutputSet(data_file_names, metadata_file_name, timings, errors, metrics)
 
     # Return the output object which contains the fully qualified file names
-    return outputSet
\ No newline at end of file
+    return outputSet
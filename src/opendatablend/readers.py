@@ -0,0 +1,290 @@
+import io
+from contextlib import contextmanager, nullcontext
+from opendatablend.opendatablend import get_data_file_name, get_data_file_cache_metadata, get_cached_data_file_name, cache_lock, transfer_data_file, record_cached_data_file, cache_dataset_metadata
+from opendatablend.api import get_session, get_download_path, concurrency_limiter
+from opendatablend.metadata import get_dataset
+from opendatablend.metrics import TransferMetrics, emit_metrics
+from opendatablend.schema import import_pyarrow, get_data_file_format, get_arrow_column_types
+from opendatablend.storage import ChunkReader, RangedReader, DataFileValidator, storage_backends, get_storage_backend, get_source_metadata, get_transfer_size, identity_encoding, default_chunk_size, cache_metadata_hash
+
+# The number of rows in each batch yielded by iter_resource when no batch size is given
+default_batch_size = 65536
+
+
+def import_pandas():
+    try:
+        import pandas
+    except ImportError:
+        raise ImportError("Reading data files into dataframes requires the pandas package. Install it with 'pip install opendatablend[dataframe]'.")
+
+    return pandas
+
+
+def check_data_file_format(data_file, resource_name):
+    data_format = get_data_file_format(data_file)
+
+    if data_format not in ('csv', 'parquet'):
+        raise ValueError(f"The data file for resource '{resource_name}' is in the '{data_format}' format, which can't be read into a table. Please choose a CSV or Parquet resource.")
+
+    return data_format
+
+
+# Get a pyarrow filter expression from filters given in the same form as pyarrow.parquet.read_table, e.g. [('year', '>=', 2020)]
+def get_filter_expression(pyarrow, filters):
+    if filters is None:
+        return None
+
+    return pyarrow.parquet.filters_to_expression(filters)
+
+
+# Get the columns that need to be read, which includes the columns that the filters refer to even if they are not selected
+def get_read_columns(columns, filters):
+    if columns is None:
+        return None
+
+    # Filters are either a list of conditions or a list of lists of conditions
+    conditions = [condition for group in (filters or []) for condition in (group if isinstance(group, list) else [group])]
+
+    return list(dict.fromkeys(list(columns) + [condition[0] for condition in conditions]))
+
+
+# Apply the filters and then the column selection to a batch of rows
+def filter_batch(pyarrow, batch, expression, columns):
+    table = pyarrow.Table.from_batches([batch])
+
+    if expression is not None:
+        table = table.filter(expression)
+    if columns is not None:
+        table = table.select(list(columns))
+
+    return table
+
+
+def open_csv_reader(pyarrow, input_file, read_columns, column_types):
+    read_options = pyarrow.csv.ReadOptions(block_size=default_chunk_size)
+    convert_options = pyarrow.csv.ConvertOptions(include_columns=read_columns, column_types={name: column_type for name, column_type in column_types.items() if read_columns is None or name in read_columns})
+
+    return pyarrow.csv.open_csv(input_file, read_options=read_options, convert_options=convert_options)
+
+
+# Parquet metadata is at the end of the file, so a data file that can't be read with ranged requests is held in memory and read through an Arrow buffer
+def get_parquet_source(pyarrow, input_file):
+    if not input_file.seekable():
+        return pyarrow.BufferReader(pyarrow.py_buffer(input_file.read()))
+
+    return input_file
+
+
+def read_parquet_table(pyarrow, input_file, columns, filters):
+    return pyarrow.parquet.read_table(get_parquet_source(pyarrow, input_file), columns=columns, filters=filters)
+
+
+def read_csv_table(pyarrow, input_file, columns, filters, column_types):
+    expression = get_filter_expression(pyarrow, filters)
+
+    # Parse the CSV a block at a time as it arrives, keeping only the rows that pass the filters
+    csv_reader = open_csv_reader(pyarrow, input_file, get_read_columns(columns, filters), column_types)
+    tables = [filter_batch(pyarrow, batch, expression, columns) for batch in csv_reader]
+
+    if not tables:
+        table = csv_reader.schema.empty_table()
+        return table.select(list(columns)) if columns is not None else table
+
+    return pyarrow.concat_tables(tables)
+
+
+# Regroup tables of any length into record batches of batch_size rows, except for the last batch which may be shorter
+def iter_batches_of_size(pyarrow, tables, batch_size):
+    pending = []
+    pending_rows = 0
+
+    for table in tables:
+        pending.append(table)
+        pending_rows += table.num_rows
+
+        while pending_rows >= batch_size:
+            combined = pyarrow.concat_tables(pending)
+            yield from combined.slice(0, batch_size).combine_chunks().to_batches()
+            pending = [combined.slice(batch_size)]
+            pending_rows -= batch_size
+
+    if pending_rows > 0:
+        yield from pyarrow.concat_tables(pending).combine_chunks().to_batches()
+
+
+# Whether a download can be read from any position with ranged requests
+def is_ranged_response(response):
+    return response.headers.get('Accept-Ranges') == 'bytes' and 'Content-Length' in response.headers and 'Content-Encoding' not in response.headers
+
+
+# Open a data file for reading from the cache if it is there, otherwise from the API. When caching, a downloaded data file is written to the cache as it is read.
+# Set seekable for data files that are read out of order, such as Parquet files. Those are cached before they are read rather than as they are read, and are read from the API with ranged requests when they are not cached.
+@contextmanager
+def open_data_file(data_file, access_key, base_path, file_system, configuration, cache, metrics, seekable=False):
+    if cache and file_system not in storage_backends:
+        print("The data file will not be cached. Please specify a supported file system.")
+        cache = False
+
+    backend = None
+    content_encoding = None
+    held = nullcontext(None)
+    if cache:
+        backend = get_storage_backend(file_system, configuration)
+        metrics.data_file_name, _, content_encoding = get_cached_data_file_name(backend, data_file, get_data_file_name(data_file, base_path))
+
+        def check_cached():
+            return backend.stat(metrics.data_file_name)
+
+        with metrics.phase('exists_check'):
+            info = check_cached()
+
+        held = nullcontext(info) if info is not None else cache_lock(backend, metrics.data_file_name, metrics, check_cached)
+
+    with held as info:
+        metrics.cache_hit = info is not None
+        cache_metadata = get_data_file_cache_metadata(data_file, content_encoding)
+
+        if metrics.cache_hit:
+            record_cached_data_file(backend, base_path, data_file, metrics.data_file_name, cache_metadata.get(cache_metadata_hash), True, configuration)
+
+            # A data file that was compressed when it was cached is decompressed as it is read
+            with backend.open_decoded_read(metrics.data_file_name, info) as input_file:
+                yield input_file
+            return
+
+        data_file_download_path = get_download_path(data_file, access_key)
+
+        if seekable and backend is not None:
+            with concurrency_limiter.slot():
+                transfer_data_file(backend, metrics.data_file_name, data_file_download_path, data_file, cache_metadata, metrics, False)
+            record_cached_data_file(backend, base_path, data_file, metrics.data_file_name, cache_metadata.get(cache_metadata_hash), False, configuration)
+
+            with backend.open_decoded_read(metrics.data_file_name) as input_file:
+                yield input_file
+            return
+
+        with get_session().get(data_file_download_path, stream=True) as response:
+            response.raise_for_status()
+
+            if seekable and is_ranged_response(response):
+                # Later reads ask for the redirected location of the data file directly
+                def open_range(offset):
+                    with get_session().get(response.url, headers=dict(identity_encoding, Range=f'bytes={offset}-'), stream=True) as ranged_response:
+                        ranged_response.raise_for_status()
+                        yield from metrics.iter_download(ranged_response.iter_content(chunk_size=default_chunk_size))
+
+                with io.BufferedReader(RangedReader(int(response.headers['Content-Length']), open_range, metrics.iter_download(response.iter_content(chunk_size=default_chunk_size))), buffer_size=default_chunk_size) as input_file:
+                    yield input_file
+                return
+
+            # Write the bytes to the cache as they are read so the data file is only downloaded once
+            writer = None
+            validator = DataFileValidator()
+            if backend is not None:
+                validator = backend.get_validator(cache_metadata)
+                writer = backend.open_encoded_write(metrics.data_file_name, get_source_metadata(cache_metadata, response.headers, validator), get_transfer_size(cache_metadata, response.headers))
+
+            input_file = io.BufferedReader(ChunkReader(validator.iter_chunks(metrics.iter_download(response.iter_content(chunk_size=default_chunk_size))), writer, metrics), buffer_size=default_chunk_size)
+
+            try:
+                yield input_file
+
+                # Make sure every byte reaches the cache even if the reader stopped before the end of the data file
+                if writer is not None:
+                    while input_file.read(default_chunk_size):
+                        pass
+                    validator.validate(metrics.data_file_name)
+            except BaseException:
+                if writer is not None:
+                    writer.abort()
+                raise
+
+            if writer is not None:
+                with metrics.phase('upload'):
+                    writer.close()
+                record_cached_data_file(backend, base_path, data_file, metrics.data_file_name, cache_metadata.get(cache_metadata_hash), False, configuration)
+
+
+# Read a data file into a pyarrow Table. If cache is set, the data file is read from the specified file system when it is already cached and is cached as it is downloaded when it isn't.
+def read_resource(dataset_path, resource_name, access_key='', columns=None, filters=None, cache=False, base_path='/', file_system='local', configuration={}):
+    pyarrow = import_pyarrow()
+
+    metrics = TransferMetrics(resource_name, file_system if cache else '')
+
+    try:
+        # Get the dataset metadata
+        with metrics.phase('descriptor'):
+            dataset = get_dataset(dataset_path)
+
+        # Get the data file metadata
+        data_file = dataset.get_resource(resource_name)
+        data_format = check_data_file_format(data_file, resource_name)
+
+        with open_data_file(data_file, access_key, base_path, file_system, configuration, cache, metrics, seekable=data_format == 'parquet') as input_file:
+            if data_format == 'parquet':
+                table = read_parquet_table(pyarrow, input_file, columns, filters)
+            else:
+                table = read_csv_table(pyarrow, input_file, columns, filters, get_arrow_column_types(pyarrow, data_file))
+    except Exception as ex:
+        metrics.error = ex
+        emit_metrics(metrics)
+        raise
+
+    emit_metrics(metrics)
+
+    # Save a copy of the dataset metadata alongside the cached data file
+    if cache and metrics.data_file_name and dataset_path.startswith('http'):
+        cache_dataset_metadata(dataset, base_path, file_system, configuration)
+
+    return table
+
+
+# Read a data file into a pandas DataFrame. If cache is set, the data file is read from the specified file system when it is already cached and is cached as it is downloaded when it isn't.
+def load_data(dataset_path, resource_name, access_key='', columns=None, filters=None, cache=False, base_path='/', file_system='local', configuration={}):
+    import_pandas()
+
+    return read_resource(dataset_path, resource_name, access_key, columns, filters, cache, base_path, file_system, configuration).to_pandas()
+
+
+# Iterate over a data file in batches of batch_size rows so that data files larger than memory can be processed. Batches are pyarrow RecordBatches, or pandas DataFrames if output is 'pandas'.
+# The data file is streamed from the API. If cache is set, it is read from the specified file system when it is already cached and is cached as it is read when it isn't.
+def iter_resource(dataset_path, resource_name, batch_size=default_batch_size, access_key='', columns=None, filters=None, output='arrow', cache=False, base_path='/', file_system='local', configuration={}):
+    pyarrow = import_pyarrow()
+    if output == 'pandas':
+        import_pandas()
+    elif output != 'arrow':
+        raise ValueError(f"The output '{output}' is not supported. Please specify 'arrow' or 'pandas'.")
+
+    metrics = TransferMetrics(resource_name, file_system if cache else '')
+    read_columns = get_read_columns(columns, filters)
+    expression = get_filter_expression(pyarrow, filters)
+
+    try:
+        # Get the dataset metadata
+        with metrics.phase('descriptor'):
+            dataset = get_dataset(dataset_path)
+
+        # Get the data file metadata
+        data_file = dataset.get_resource(resource_name)
+        data_format = check_data_file_format(data_file, resource_name)
+
+        with open_data_file(data_file, access_key, base_path, file_system, configuration, cache, metrics, seekable=data_format == 'parquet') as input_file:
+            if data_format == 'parquet':
+                batches = pyarrow.parquet.ParquetFile(get_parquet_source(pyarrow, input_file)).iter_batches(batch_size=batch_size, columns=read_columns)
+            else:
+                batches = open_csv_reader(pyarrow, input_file, read_columns, get_arrow_column_types(pyarrow, data_file))
+
+            tables = (filter_batch(pyarrow, batch, expression, columns) for batch in batches)
+
+            for batch in iter_batches_of_size(pyarrow, tables, batch_size):
+                yield batch.to_pandas() if output == 'pandas' else batch
+    except GeneratorExit:
+        # The caller stopped iterating before the end of the data file
+        emit_metrics(metrics)
+        raise
+    except Exception as ex:
+        metrics.error = ex
+        emit_metrics(metrics)
+        raise
+
+    emit_metrics(metrics)
@@ -0,0 +1,77 @@
+import os
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.csv
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Reading data files into tables requires the pyarrow package. Install it with 'pip install opendatablend[dataframe]'.")
+
+    return pyarrow
+
+
+# Get the format of a data file from the dataset metadata, falling back to its file extension
+def get_data_file_format(data_file):
+    data_format = data_file.get('format') or os.path.splitext(data_file.path.split('?')[0])[1].lstrip('.')
+
+    return data_format.lower()
+
+
+# Get the narrowest integer type that holds every value allowed by the field constraints, or a 64-bit integer if they don't limit the range
+def get_integer_type(pyarrow, field):
+    constraints = field.get('constraints') or {}
+    minimum = constraints.get('minimum')
+    maximum = constraints.get('maximum')
+
+    if minimum is None or maximum is None:
+        return pyarrow.int64()
+
+    for integer_type, bits in ((pyarrow.int8(), 8), (pyarrow.int16(), 16), (pyarrow.int32(), 32)):
+        if -2 ** (bits - 1) <= int(minimum) and int(maximum) < 2 ** (bits - 1):
+            return integer_type
+
+    return pyarrow.int64()
+
+
+# Get the pyarrow type for a field in the data file schema, or None if the type should be inferred from the values
+def get_arrow_type(pyarrow, field):
+    field_type = field.get('type')
+
+    # Strings limited to a set of values are stored as categoricals
+    if field_type == 'string':
+        if (field.get('constraints') or {}).get('enum'):
+            return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+        return pyarrow.string()
+
+    # Fields with a custom format and datetimes, which may or may not have a zone offset, are left for pyarrow to infer
+    if field.get('format', 'default') != 'default':
+        return None
+
+    if field_type == 'integer':
+        return get_integer_type(pyarrow, field)
+
+    field_types = {
+        'number': pyarrow.float64(),
+        'boolean': pyarrow.bool_(),
+        'date': pyarrow.date32(),
+        'time': pyarrow.time64('us'),
+        'year': pyarrow.int16()
+    }
+
+    return field_types.get(field_type)
+
+
+# Get the pyarrow type for each field in the data file schema so CSV values are parsed as the declared types rather than inferred
+def get_arrow_column_types(pyarrow, data_file):
+    schema = data_file.get('schema') or {}
+
+    column_types = {}
+    for field in schema.get('fields', []):
+        arrow_type = get_arrow_type(pyarrow, field)
+        if arrow_type is not None:
+            column_types[field['name']] = arrow_type
+
+    return column_types
@@ -0,0 +1,1674 @@
+import io
+import os
+import errno
+import json
+import gzip
+import zlib
+import base64
+import hashlib
+import threading
+
+# Local files are locked with flock on POSIX systems and msvcrt on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from opendatablend.api import get_session
+from opendatablend.metrics import TransferMetrics
+
+# The chunk size used when streaming data files from the Open Data Blend API
+default_chunk_size = 4 * 1024 * 1024
+
+# Local downloads are written to a partial file first and are retried from where they stopped this many times
+partial_file_suffix = '.partial'
+segmented_partial_file_suffix = '.segmented.partial'
+default_download_attempts = 3
+
+# Files at least this large are split into ranged segments when the local file system is configured with more than one segment
+default_segment_threshold = 64 * 1024 * 1024
+
+# Byte offsets must refer to the file itself, so ranged downloads ask the server not to compress the response. Other downloads let the server compress the response, which is decompressed as it arrives.
+identity_encoding = {'Accept-Encoding': 'identity'}
+
+# The object metadata keys used to record what was cached, so later requests can tell whether the cached file is still current
+cache_metadata_bytes = 'odb_bytes'
+cache_metadata_hash = 'odb_hash'
+cache_metadata_etag = 'odb_etag'
+cache_metadata_last_modified = 'odb_last_modified'
+
+# The object metadata key used to record that the bytes of a file were checked against the declared hash as it was cached
+cache_metadata_validated = 'odb_validated'
+
+# A lock is held while a data file is cached so that processes requesting the same data file download it once. Locks in cloud storage services are leases which expire unless they are renewed, so a lock held by a process that has died is eventually released.
+lock_file_suffix = '.lock'
+default_lock_poll_interval = 0.5
+default_lock_lease_duration = 60
+
+# The object metadata keys used to record that a cached file was converted from the format it was published in
+cache_metadata_converted_from = 'odb_converted_from'
+cache_metadata_compression = 'odb_compression'
+
+# Data files can be compressed when they are cached by setting "compression" in the configuration. The encoding is recorded in the file's metadata, and set as its Content-Encoding in cloud storage services, so the file is decompressed as it is read.
+cache_metadata_content_encoding = 'odb_content_encoding'
+content_encodings = ('gzip', 'zstd')
+
+# Local files have no Content-Encoding, so a compressed data file cached locally is named with the extension of its encoding
+content_encoding_extensions = {'gzip': '.gz', 'zstd': '.zst'}
+
+# Data files in these formats are already compressed, so they are cached as they are
+precompressed_file_extensions = ('.parquet', '.zip', '.gz', '.zst', '.bz2', '.xz')
+
+# The number of pooled connections each Amazon S3 client keeps open
+default_s3_max_pool_connections = 32
+
+# The chunk size used for resumable uploads to Google Cloud Storage. It must be a multiple of 256 KB.
+default_gcs_chunk_size = 4 * 1024 * 1024
+gcs_chunk_size_multiple = 256 * 1024
+
+# The part size and number of parts uploaded at once when streaming to Amazon S3. Parts must be at least 5 MB and an upload can have at most 10,000 parts.
+default_s3_part_size = 8 * 1024 * 1024
+default_s3_max_concurrency = 4
+s3_min_part_size = 5 * 1024 * 1024
+s3_max_parts = 10000
+
+# Azure copies blobs up to this size from the URL in a single request. Larger blobs are staged in blocks of the given size, several at once, and blobs of unknown size are copied asynchronously by the service.
+default_azure_copy_threshold = 256 * 1024 * 1024
+default_azure_copy_block_size = 100 * 1024 * 1024
+default_azure_copy_max_concurrency = 8
+default_azure_copy_poll_interval = 2
+azure_max_blocks = 50000
+
+
+# The SDK for each cloud storage service is only imported when its backend is first used, so that importing the package stays fast and only the SDKs that are used need to be installed
+def import_azure_storage():
+    try:
+        import azure.storage.blob
+        import azure.core.exceptions
+    except ImportError:
+        raise ImportError("The azure_blob_storage file system requires the azure-storage-blob package. Install it with 'pip install opendatablend[azure]'.")
+
+    return azure
+
+
+def import_boto3():
+    try:
+        import boto3
+        import botocore.config
+    except ImportError:
+        raise ImportError("The amazon_s3 file system requires the boto3 package. Install it with 'pip install opendatablend[s3]'.")
+
+    return boto3, botocore
+
+
+def import_google_cloud_storage():
+    try:
+        import google.cloud.storage
+        import google.api_core.exceptions
+    except ImportError:
+        raise ImportError("The google_cloud_storage file system requires the google-cloud-storage package. Install it with 'pip install opendatablend[gcs]'.")
+
+    return google
+
+
+def import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Caching data files with zstd compression requires the zstandard package. Install it with 'pip install opendatablend[compression]'.")
+
+    return zstandard
+
+
+# Get an object that compresses bytes into the content encoding a chunk at a time
+def get_compressor(content_encoding, level=None):
+    if content_encoding == 'gzip':
+        return zlib.compressobj(level if level is not None else zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    return import_zstandard().ZstdCompressor(level=level if level is not None else 3).compressobj()
+
+
+# Open a readable file-like object that decompresses a stored file in the content encoding as it is read
+def open_decoder(input_file, content_encoding):
+    if content_encoding == 'gzip':
+        return gzip.GzipFile(fileobj=input_file, mode='rb')
+
+    return import_zstandard().ZstdDecompressor().stream_reader(input_file)
+
+
+# Get the encoding a stored file was compressed with when it was cached, or None if it wasn't compressed
+def get_stored_content_encoding(info):
+    if info is None or not info.metadata:
+        return None
+
+    return info.metadata.get(cache_metadata_content_encoding)
+
+
+class StorageObjectInfo:
+    def __init__(self, size, etag=None, md5=None, metadata=None, checksum=None):
+        self.size = size
+        self.etag = etag
+        self.md5 = md5
+        self.metadata = metadata if metadata is not None else {}
+        # A checksum of the whole file, in any algorithm, that the storage service checked against the bytes it received when the file was written
+        self.checksum = checksum
+
+
+# A file-like object that buffers written bytes into parts and hands each full part to the storage service
+class StorageWriter:
+    def __init__(self, part_size):
+        self.part_size = part_size
+        self.bytes_written = 0
+        self.closed = False
+        self._buffer = bytearray()
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+        self._buffer += data
+        self.bytes_written += len(data)
+
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._write_part(part)
+
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        self._finish(bytes(self._buffer))
+        self._buffer = bytearray()
+
+    def abort(self):
+        self.closed = True
+        self._buffer = bytearray()
+
+    def _write_part(self, part):
+        raise NotImplementedError
+
+    def _finish(self, remainder):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't leave a partially written object behind
+            self.abort()
+
+
+# A file-like object over the chunks of a download which, if given a writer, also writes each chunk to a storage backend as it arrives
+class ChunkReader(io.RawIOBase):
+    def __init__(self, chunks, writer=None, metrics=None):
+        self._chunks = iter(chunks)
+        self._writer = writer
+        self._metrics = metrics if metrics is not None else TransferMetrics()
+        self._chunk = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while len(self._chunk) == 0:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+
+            if self._writer is not None:
+                with self._metrics.phase('upload'):
+                    self._writer.write(chunk)
+
+            self._chunk = memoryview(chunk)
+
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+
+        return size
+
+    # Stop a download that was only partly read so its connection is released
+    def close(self):
+        if not self.closed and hasattr(self._chunks, 'close'):
+            self._chunks.close()
+
+        super().close()
+
+
+# A seekable file-like object over a stored file which streams its bytes from the current position. Seeking elsewhere starts a ranged download from there, so Parquet files can be read a row group at a time rather than being held in memory.
+# open_range is called with an offset and returns the chunks of the file from that offset. Pass the chunks of a download that has already started from the beginning of the file, if there is one.
+class RangedReader(io.RawIOBase):
+    def __init__(self, size, open_range, chunks=None):
+        self.size = size
+        self._open_range = open_range
+        self._position = 0
+        self._input_file = ChunkReader(chunks) if chunks is not None else None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+
+        if offset < 0:
+            raise ValueError(f"Can't seek to {offset}, which is before the start of the file.")
+
+        if offset != self._position and self._input_file is not None:
+            self._input_file.close()
+            self._input_file = None
+
+        self._position = offset
+
+        return offset
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+
+        if self._input_file is None:
+            self._input_file = ChunkReader(self._open_range(self._position))
+
+        size = self._input_file.readinto(buffer)
+        self._position += size
+
+        return size
+
+    def close(self):
+        if not self.closed and self._input_file is not None:
+            self._input_file.close()
+
+        super().close()
+
+
+# Iterate over the body of an S3 object and close it afterwards, including when it is only partly read
+def iter_streaming_body(body):
+    try:
+        yield from body.iter_chunks(default_chunk_size)
+    finally:
+        body.close()
+
+
+# Compresses the bytes written to it and passes them on to the writer of a storage backend, so only the compressed bytes are uploaded
+class EncodingWriter:
+    def __init__(self, writer, content_encoding, level=None):
+        self.writer = writer
+        self.content_encoding = content_encoding
+        self.bytes_written = 0
+        self.closed = False
+        self._compressor = get_compressor(content_encoding, level)
+
+    def write(self, data):
+        self.bytes_written += len(data)
+
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self.writer.write(compressed)
+
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        self.writer.write(self._compressor.flush())
+        self.writer.close()
+
+    def abort(self):
+        self.closed = True
+        self.writer.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# A file-like object that decompresses a stored file as it is read, so a compressed data file is never held in memory or written out decompressed
+class DecodingReader(io.RawIOBase):
+    def __init__(self, input_file, content_encoding):
+        self._input_file = input_file
+        self._decoder = open_decoder(input_file, content_encoding)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._decoder.read(len(buffer))
+        buffer[:len(data)] = data
+
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._decoder.close()
+            self._input_file.close()
+
+        super().close()
+
+
+# A lock on a file in a file system. The base class doesn't lock anything, which suits file systems that only this process uses.
+class StorageLock:
+    def acquire(self):
+        pass
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class TimeoutStorageLock(StorageLock):
+    def __init__(self, name, timeout=None, poll_interval=default_lock_poll_interval):
+        self.name = name
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    # Call try_acquire until it succeeds, waiting between attempts, or raise a TimeoutError once the timeout has passed
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+
+        while not self.try_acquire():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for the lock on {self.name}.")
+            time.sleep(self.poll_interval)
+
+    def try_acquire(self):
+        raise NotImplementedError
+
+
+# Locks a local file using an operating system lock on a hidden lock file next to it. The operating system releases the lock if the process dies.
+class LocalFileLock(TimeoutStorageLock):
+    def __init__(self, file_name, timeout=None):
+        super().__init__(file_name, timeout)
+        self.lock_file_name = os.path.join(os.path.dirname(file_name), '.' + os.path.basename(file_name) + lock_file_suffix)
+        self._lock_file = None
+
+    def try_acquire(self):
+        lock_file = open(self.lock_file_name, 'a+b')
+
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+
+        # The lock file is removed along with the data file when the data file is evicted from the cache, so a process that was waiting on the removed lock file has to lock the one that replaced it
+        try:
+            is_current = os.path.samestat(os.fstat(lock_file.fileno()), os.stat(self.lock_file_name))
+        except OSError:
+            is_current = False
+
+        if not is_current:
+            self._unlock(lock_file)
+            return False
+
+        self._lock_file = lock_file
+        return True
+
+    def release(self):
+        if self._lock_file is None:
+            return
+
+        self._unlock(self._lock_file)
+        self._lock_file = None
+
+    def _unlock(self, lock_file):
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+        lock_file.close()
+
+
+# Locks a file in a cloud storage service by creating a lock object only if it doesn't already exist. The lock object records when its lease expires and is renewed in the background while the lock is held, so a lock left by a process that died can be taken over once it expires.
+class LeaseStorageLock(TimeoutStorageLock):
+    def __init__(self, name, timeout=None, lease_duration=default_lock_lease_duration):
+        super().__init__(name, timeout)
+        self.lease_duration = lease_duration
+        self.owner = uuid.uuid4().hex
+        self._released = threading.Event()
+        self._renewal_thread = None
+
+    def get_lease(self):
+        return json.dumps({"owner": self.owner, "expires_at": time.time() + self.lease_duration}).encode()
+
+    def try_acquire(self):
+        if self._try_create():
+            return True
+
+        lease = self._read()
+        if lease is None:
+            return self._try_create()
+
+        content, version = lease
+
+        # Take over a lease that its owner has stopped renewing. Leases are compared using this machine's clock, so they are long enough to absorb some clock skew.
+        try:
+            expired = json.loads(content)["expires_at"] < time.time()
+        except (ValueError, KeyError, TypeError):
+            expired = True
+
+        if expired:
+            self._delete(version)
+            return self._try_create()
+
+        return False
+
+    def _try_create(self):
+        if not self._create(self.get_lease()):
+            return False
+
+        self._start_renewal()
+        return True
+
+    def release(self):
+        if self._renewal_thread is None:
+            return
+
+        self._released.set()
+        self._renewal_thread.join()
+        self._renewal_thread = None
+        self._delete_own()
+
+    def _start_renewal(self):
+        self._released.clear()
+        self._renewal_thread = threading.Thread(target=self._renew_until_released, daemon=True)
+        self._renewal_thread.start()
+
+    def _renew_until_released(self):
+        while not self._released.wait(self.lease_duration / 3):
+            try:
+                self._renew(self.get_lease())
+            except Exception:
+                # A failed renewal is retried at the next interval, well before the lease expires
+                pass
+
+    # Create the lock object if it doesn't exist and return whether it was created
+    def _create(self, content):
+        raise NotImplementedError
+
+    # Get the content and version of the lock object, or None if it doesn't exist
+    def _read(self):
+        raise NotImplementedError
+
+    # Delete an expired lock object, as long as it is still the version that was read
+    def _delete(self, version):
+        raise NotImplementedError
+
+    def _renew(self, content):
+        raise NotImplementedError
+
+    def _delete_own(self):
+        raise NotImplementedError
+
+
+class StorageBackend:
+    def __init__(self, configuration):
+        self.configuration = configuration
+
+        compression = configuration.get("compression")
+        if compression is not None and compression not in content_encodings:
+            raise ValueError(f"The compression '{compression}' is not supported. Please specify one of {', '.join(content_encodings)}.")
+
+    # Get the name the file is stored under in this file system
+    def get_output_file_name(self, file_name):
+        # Remove the leading slash
+        return file_name.replace("/opendatablend","opendatablend")
+
+    def exists(self, file_name):
+        return self.stat(file_name) is not None
+
+    # Get the size and checksums of a stored file, or None if it doesn't exist
+    def stat(self, file_name):
+        raise NotImplementedError
+
+    # Open a file-like object that streams written bytes into the file system. The metadata is stored alongside the file and the size, if it is known, lets the backend plan the upload.
+    def open_write(self, file_name, metadata=None, size=None):
+        raise NotImplementedError
+
+    def write_bytes(self, file_name, data, metadata=None):
+        with self.open_write(file_name, metadata, len(data)) as output_file:
+            output_file.write(data)
+
+    # Open a readable binary file-like object over a stored file
+    def open_read(self, file_name):
+        raise NotImplementedError
+
+    # Get a lock that is held while a file is cached so that other processes wait for it rather than downloading it too
+    def lock(self, file_name):
+        return StorageLock()
+
+    # Get the encoding a data file is compressed with when it is cached, or None if it is cached as it is
+    def get_content_encoding(self, file_name):
+        compression = self.configuration.get("compression")
+
+        if compression is None or file_name.lower().endswith(precompressed_file_extensions):
+            return None
+
+        return compression
+
+    # Get the name a data file compressed with the content encoding is stored under. Storage services record the encoding as the file's Content-Encoding, so the name is unchanged.
+    def get_encoded_file_name(self, file_name, content_encoding):
+        return file_name
+
+    # Open a writer for a data file that compresses it as it is written, if the metadata records an encoding to compress it with
+    def open_encoded_write(self, file_name, metadata=None, size=None):
+        content_encoding = (metadata or {}).get(cache_metadata_content_encoding)
+        if content_encoding is None:
+            return self.open_write(file_name, metadata, size)
+
+        # The compressed size isn't known in advance, so the upload is planned from the uncompressed size
+        return EncodingWriter(self.open_write(file_name, metadata, size), content_encoding, self.configuration.get("compression_level"))
+
+    # Open a stored data file for reading, decompressing it as it is read if it was compressed when it was cached. Pass the file's info if it has already been fetched with stat.
+    def open_decoded_read(self, file_name, info=None):
+        if info is None:
+            info = self.stat(file_name)
+
+        content_encoding = get_stored_content_encoding(info)
+        if content_encoding is None:
+            return self.open_read(file_name)
+
+        return io.BufferedReader(DecodingReader(self.open_read(file_name), content_encoding), buffer_size=default_chunk_size)
+
+    # Get a validator that checks a downloaded file against the size and hash in its metadata, unless validation is turned off in the configuration
+    def get_validator(self, metadata):
+        return DataFileValidator(metadata if self.configuration.get("validate", True) else None)
+
+    # Stream a file from a URL into the file system, recording the time spent downloading and uploading in the metrics
+    def upload_from_url(self, file_name, url, metadata=None, metrics=None):
+        if metrics is None:
+            metrics = TransferMetrics()
+
+        validator = self.get_validator(metadata)
+
+        with get_session().get(url, stream=True) as data:
+            data.raise_for_status()
+
+            with self.open_encoded_write(file_name, get_source_metadata(metadata, data.headers, validator), get_transfer_size(metadata, data.headers)) as output_file:
+                for chunk in validator.iter_chunks(metrics.iter_download(data.iter_content(chunk_size=default_chunk_size))):
+                    with metrics.phase('upload'):
+                        output_file.write(chunk)
+
+                # Abort the upload rather than cache a file that doesn't match its metadata
+                validator.validate(file_name)
+
+                # Closing the writer sends the last part and completes the upload
+                with metrics.phase('upload'):
+                    output_file.close()
+
+
+# Add the validators the server returned for a file to the metadata that will be stored with it. Pass the validator the bytes will be checked with to record whether they are checked against the declared hash before the file is stored.
+def get_source_metadata(metadata, headers, validator=None):
+    source_metadata = dict(metadata or {})
+
+    if 'ETag' in headers:
+        source_metadata[cache_metadata_etag] = headers['ETag']
+    if 'Last-Modified' in headers:
+        source_metadata[cache_metadata_last_modified] = headers['Last-Modified']
+    if validator is not None and validator.hash_algorithm is not None:
+        source_metadata[cache_metadata_validated] = 'true'
+
+    return source_metadata
+
+
+# Get the size of a file from the size declared in the dataset metadata, falling back to the Content-Length the server returned, or None if neither is known
+def get_transfer_size(metadata, headers=None):
+    if metadata and metadata.get(cache_metadata_bytes):
+        return int(metadata[cache_metadata_bytes])
+
+    if headers and 'Content-Length' in headers and 'Content-Encoding' not in headers:
+        return int(headers['Content-Length'])
+
+    return None
+
+
+# Check whether a cached file matches the expected metadata, using the strongest comparison that both sides support
+def is_cached_file_current(info, expected_metadata):
+    if info is None:
+        return False
+
+    stored_metadata = info.metadata or {}
+
+    # A converted or compressed file differs from the data file it was cached from, so compare against what was recorded about that data file when it was cached
+    if stored_metadata.get(cache_metadata_converted_from) or stored_metadata.get(cache_metadata_content_encoding):
+        stored_bytes = stored_metadata.get(cache_metadata_bytes)
+        info = StorageObjectInfo(int(stored_bytes) if stored_bytes is not None else None, metadata=stored_metadata)
+
+    # Compare the declared hash with the one recorded when the file was cached, or with the checksum the file system calculated
+    expected_hash = expected_metadata.get(cache_metadata_hash)
+    if expected_hash:
+        if stored_metadata.get(cache_metadata_hash):
+            return stored_metadata[cache_metadata_hash] == expected_hash
+
+        algorithm, _, digest = expected_hash.rpartition(':')
+        if algorithm in ('', 'md5') and info.md5:
+            return info.md5 == digest
+
+    # Fall back to the size, which catches most republished and truncated files
+    expected_bytes = expected_metadata.get(cache_metadata_bytes)
+    if expected_bytes is not None:
+        return info.size == int(expected_bytes)
+
+    # Otherwise compare the validators that the server returned for the file
+    for key in (cache_metadata_etag, cache_metadata_last_modified):
+        if expected_metadata.get(key) and stored_metadata.get(key):
+            return stored_metadata[key] == expected_metadata[key]
+
+    # Nothing can be compared so the file is assumed to be current
+    return True
+
+
+class IncompleteDownloadError(IOError):
+    pass
+
+
+class DataFileValidationError(IOError):
+    pass
+
+
+# Checks the bytes of a downloaded file against the size and hash declared in the dataset metadata
+class DataFileValidator:
+    def __init__(self, expected_metadata=None):
+        expected_metadata = expected_metadata or {}
+        self.size = 0
+
+        expected_bytes = expected_metadata.get(cache_metadata_bytes)
+        self.expected_bytes = int(expected_bytes) if expected_bytes is not None else None
+
+        # Hashes are given as 'algorithm:digest', or as a bare MD5 digest
+        self.expected_digest = None
+        self._hash = None
+        expected_hash = expected_metadata.get(cache_metadata_hash)
+        if expected_hash:
+            algorithm, _, digest = expected_hash.rpartition(':')
+            try:
+                self._hash = hashlib.new(algorithm or 'md5')
+                self.expected_digest = digest.lower()
+            except ValueError:
+                # The hash algorithm isn't available, so only the size is checked
+                pass
+
+    @property
+    def has_checks(self):
+        return self.expected_bytes is not None or self._hash is not None
+
+    # The name of the hash algorithm that will be checked, or None if no hash will be checked
+    @property
+    def hash_algorithm(self):
+        return self._hash.name if self._hash is not None else None
+
+    def update(self, chunk):
+        self.size += len(chunk)
+        if self._hash is not None:
+            self._hash.update(chunk)
+
+    def iter_chunks(self, chunks):
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+    def validate_size(self, name, size):
+        if self.expected_bytes is not None and size != self.expected_bytes:
+            raise DataFileValidationError(f"{size} bytes were downloaded for {name} but the dataset metadata declares {self.expected_bytes} bytes.")
+
+    def validate(self, name):
+        self.validate_size(name, self.size)
+
+        if self._hash is not None and self._hash.hexdigest() != self.expected_digest:
+            raise DataFileValidationError(f"The hash of the data downloaded for {name} doesn't match the hash declared in the dataset metadata.")
+
+    # Validate a local file by reading it back, removing it if it doesn't match
+    def validate_file(self, file_name, name):
+        if not self.has_checks:
+            return
+
+        with open(file_name, 'rb') as local_file:
+            for chunk in iter(lambda: local_file.read(default_chunk_size), b''):
+                self.update(chunk)
+
+        try:
+            self.validate(name)
+        except DataFileValidationError:
+            os.remove(file_name)
+            raise
+
+
+# Writes to a partial file which replaces the destination file when it is closed
+class LocalFileWriter:
+    def __init__(self, backend, file_name, metadata):
+        self.backend = backend
+        self.file_name = file_name
+        self.metadata = metadata
+        self.closed = False
+        self._partial_file = open(file_name + partial_file_suffix, 'wb')
+
+    def write(self, data):
+        return self._partial_file.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        self._partial_file.close()
+        os.replace(self.file_name + partial_file_suffix, self.file_name)
+        self.backend.write_metadata(self.file_name, self.metadata)
+
+    def abort(self):
+        self._partial_file.close()
+        os.remove(self.file_name + partial_file_suffix)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class LocalStorageBackend(StorageBackend):
+    # Local file names are used as they are so they stay relative to the base path
+    def get_output_file_name(self, file_name):
+        return file_name
+
+    def stat(self, file_name):
+        if not os.path.exists(file_name):
+            return None
+
+        return StorageObjectInfo(os.path.getsize(file_name), metadata=self.read_metadata(file_name))
+
+    def open_write(self, file_name, metadata=None, size=None):
+        self._make_directory(file_name)
+
+        return LocalFileWriter(self, file_name, metadata)
+
+    def open_read(self, file_name):
+        return open(file_name, 'rb')
+
+    # Tools such as pandas.read_csv tell how a local file is compressed from its extension
+    def get_encoded_file_name(self, file_name, content_encoding):
+        if content_encoding is None:
+            return file_name
+
+        return file_name + content_encoding_extensions[content_encoding]
+
+    def lock(self, file_name):
+        self._make_directory(file_name)
+
+        return LocalFileLock(file_name, self.configuration.get("lock_timeout"))
+
+    # Download a file into a partial file which is only renamed to the final file name once it is complete
+    def upload_from_url(self, file_name, url, metadata=None, metrics=None):
+        # A compressed data file can't be resumed or split into segments, so it is streamed through the compressor into a partial file instead
+        if (metadata or {}).get(cache_metadata_content_encoding) is not None:
+            return super().upload_from_url(file_name, url, metadata, metrics)
+
+        if metrics is None:
+            metrics = TransferMetrics()
+
+        self._make_directory(file_name)
+
+        validator = self.get_validator(metadata)
+
+        # Large files can optionally be split into ranged segments which are downloaded at the same time
+        segments = self.configuration.get("segments", 1)
+        if segments > 1:
+            size, headers = self._get_ranged_download_size(url)
+            if size is not None and size >= self.configuration.get("segment_threshold", default_segment_threshold):
+                # The segments overlap so the time is recorded for the download as a whole
+                with metrics.phase('download'):
+                    self._download_segments(file_name, url, size, segments, validator)
+                metrics.add_bytes(size)
+                self.write_metadata(file_name, get_source_metadata(metadata, headers, validator))
+                return
+
+        headers = self._download_resumable(file_name, url, metrics, validator)
+        self.write_metadata(file_name, get_source_metadata(metadata, headers, validator))
+
+    # The metadata for a local file is kept in a hidden file next to it
+    def get_metadata_file_name(self, file_name):
+        return os.path.join(os.path.dirname(file_name), '.' + os.path.basename(file_name) + '.metadata.json')
+
+    def read_metadata(self, file_name):
+        metadata_file_name = self.get_metadata_file_name(file_name)
+
+        if not os.path.exists(metadata_file_name):
+            return {}
+
+        with open(metadata_file_name, 'r') as metadata_file:
+            return json.load(metadata_file)
+
+    def write_metadata(self, file_name, metadata):
+        metadata_file_name = self.get_metadata_file_name(file_name)
+
+        if not metadata:
+            # Don't leave metadata describing an earlier version of the file
+            if os.path.exists(metadata_file_name):
+                os.remove(metadata_file_name)
+            return
+
+        with open(metadata_file_name, 'w') as metadata_file:
+            json.dump(metadata, metadata_file)
+
+    def _make_directory(self, file_name):
+        # Create the directory for the file if it doesn't exist
+        if not os.path.exists(os.path.dirname(file_name)):
+            try:
+                os.makedirs(os.path.dirname(file_name))
+            except OSError as ex:
+                if ex.errno != errno.EEXIST:
+                    raise
+
+    # Get the size of a file if the server supports range requests for it, otherwise None, along with the response headers
+    def _get_ranged_download_size(self, url):
+        response = get_session().head(url, headers=identity_encoding, allow_redirects=True)
+
+        if response.status_code != 200 or response.headers.get('Accept-Ranges') != 'bytes' or 'Content-Length' not in response.headers:
+            return None, response.headers
+
+        return int(response.headers['Content-Length']), response.headers
+
+    # Returns the response headers so the validators for the file can be recorded
+    def _download_resumable(self, file_name, url, metrics, validator=None):
+        partial_file_name = file_name + partial_file_suffix
+        headers = {}
+
+        for attempt in range(default_download_attempts):
+            # Carry on from the end of any partial file left by an earlier attempt or an earlier run
+            offset = os.path.getsize(partial_file_name) if os.path.exists(partial_file_name) else 0
+
+            # A fresh download lets the server compress the response. The partial file holds the decompressed bytes, so a later attempt can carry on from its size with a ranged request.
+            headers = {}
+            if offset > 0:
+                headers = dict(identity_encoding)
+                headers['Range'] = f'bytes={offset}-'
+
+            try:
+                with get_session().get(url, headers=headers, stream=True) as data:
+                    headers = data.headers
+
+                    # The partial file already holds the whole file
+                    if offset > 0 and data.status_code == 416 and data.headers.get('Content-Range') == f'bytes */{offset}':
+                        break
+
+                    data.raise_for_status()
+
+                    # Start again if the server ignored the range request
+                    if data.status_code != 206:
+                        offset = 0
+
+                    # The Content-Length of a compressed response is its compressed size, so it can't be compared with the bytes written
+                    expected_size = offset + int(data.headers['Content-Length']) if 'Content-Length' in data.headers and 'Content-Encoding' not in data.headers else None
+
+                    # Download the data file using a 4 MB chunk size
+                    with open(partial_file_name, 'ab' if offset > 0 else 'wb') as local_file:
+                        for chunk in metrics.iter_download(data.iter_content(chunk_size=default_chunk_size)):
+                            with metrics.phase('upload'):
+                                local_file.write(chunk)
+
+                        size = local_file.tell()
+
+                    if expected_size is not None and size != expected_size:
+                        raise IncompleteDownloadError(f"Only {size} of {expected_size} bytes of {url} were downloaded.")
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError, IncompleteDownloadError):
+                # Keep the partial file so the next attempt can resume from it
+                if attempt == default_download_attempts - 1:
+                    raise
+
+        # The partial file may have been written by several attempts, so it is checked as a whole
+        if validator is not None:
+            validator.validate_file(partial_file_name, file_name)
+
+        os.replace(partial_file_name, file_name)
+
+        return headers
+
+    def _download_segments(self, file_name, url, size, segments, validator=None):
+        # Segmented downloads can't be resumed from their size alone, so they use their own partial file and always start afresh
+        partial_file_name = file_name + segmented_partial_file_suffix
+
+        with open(partial_file_name, 'wb') as local_file:
+            local_file.truncate(size)
+
+        segment_size = -(-size // segments)
+        ranges = [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+
+        def download_segment(segment_range):
+            position, end = segment_range
+
+            for attempt in range(default_download_attempts):
+                headers = dict(identity_encoding)
+                headers['Range'] = f'bytes={position}-{end}'
+
+                try:
+                    with get_session().get(url, headers=headers, stream=True) as data:
+                        data.raise_for_status()
+
+                        if data.status_code != 206:
+                            raise IncompleteDownloadError(f"The server did not return the requested range of {url}.")
+
+                        with open(partial_file_name, 'r+b') as local_file:
+                            local_file.seek(position)
+                            for chunk in data.iter_content(chunk_size=default_chunk_size):
+                                local_file.write(chunk)
+                                position += len(chunk)
+
+                    if position != end + 1:
+                        raise IncompleteDownloadError(f"Only part of bytes {segment_range[0]}-{end} of {url} were downloaded.")
+                    return
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, IncompleteDownloadError):
+                    # Retry from the last byte that was written
+                    if attempt == default_download_attempts - 1:
+                        raise
+
+        try:
+            with ThreadPoolExecutor(max_workers=segments) as executor:
+                list(executor.map(download_segment, ranges))
+        except Exception:
+            os.remove(partial_file_name)
+            raise
+
+        if validator is not None:
+            validator.validate_file(partial_file_name, file_name)
+
+        os.replace(partial_file_name, file_name)
+
+
+class MemoryStorageLock(TimeoutStorageLock):
+    def __init__(self, backend, file_name, timeout=None):
+        super().__init__(file_name, timeout)
+        with backend._lock:
+            self._lock = backend.file_locks.setdefault(file_name, threading.Lock())
+        self._locked = False
+
+    def try_acquire(self):
+        self._locked = self._lock.acquire(blocking=False)
+        return self._locked
+
+    def release(self):
+        if self._locked:
+            self._locked = False
+            self._lock.release()
+
+
+class MemoryStorageWriter(StorageWriter):
+    def __init__(self, backend, file_name, metadata):
+        super().__init__(default_chunk_size)
+        self.backend = backend
+        self.file_name = file_name
+        self.metadata = metadata
+        self._parts = []
+
+    def _write_part(self, part):
+        self._parts.append(part)
+
+    def _finish(self, remainder):
+        self._parts.append(remainder)
+        with self.backend._lock:
+            self.backend.files[self.file_name] = b''.join(self._parts)
+            self.backend.metadata[self.file_name] = dict(self.metadata or {})
+
+
+# An in-memory stand-in for a cloud storage service. It needs no credentials, which makes it useful for testing and benchmarking.
+class MemoryStorageBackend(StorageBackend):
+    def __init__(self, configuration):
+        super().__init__(configuration)
+        self.files = {}
+        self.metadata = {}
+        self.file_locks = {}
+        self._lock = threading.Lock()
+
+    def stat(self, file_name):
+        with self._lock:
+            if file_name not in self.files:
+                return None
+            return StorageObjectInfo(len(self.files[file_name]), metadata=dict(self.metadata[file_name]))
+
+    def open_write(self, file_name, metadata=None, size=None):
+        return MemoryStorageWriter(self, file_name, metadata)
+
+    def open_read(self, file_name):
+        with self._lock:
+            return io.BytesIO(self.files[file_name])
+
+    def lock(self, file_name):
+        return MemoryStorageLock(self, file_name, self.configuration.get("lock_timeout"))
+
+
+class AzureBlockBlobWriter(StorageWriter):
+    def __init__(self, blob_client, metadata):
+        super().__init__(default_chunk_size)
+        self.blob_client = blob_client
+        self.metadata = metadata
+        self._block_ids = []
+
+        # A compressed data file is given its Content-Encoding
+        self.content_encoding = (metadata or {}).get(cache_metadata_content_encoding)
+
+        # Azure only works out the MD5 of blobs uploaded in a single request, so it is worked out as the blocks are written and set when they are committed. verify_cache can then compare it with the declared hash without reading the blob back.
+        self._md5 = hashlib.md5()
+
+    def _write_part(self, part):
+        block_id = base64.b64encode(f'{len(self._block_ids):08d}'.encode()).decode()
+        self._md5.update(part)
+        self.blob_client.stage_block(block_id, part)
+        self._block_ids.append(block_id)
+
+    def _get_content_settings(self):
+        return import_azure_storage().storage.blob.ContentSettings(content_encoding=self.content_encoding, content_md5=bytearray(self._md5.digest()))
+
+    def _finish(self, remainder):
+        # Small blobs are uploaded in a single request
+        if not self._block_ids:
+            self._md5.update(remainder)
+            self.blob_client.upload_blob(remainder, overwrite=True, metadata=self.metadata, content_settings=self._get_content_settings())
+            return
+
+        if remainder:
+            self._write_part(remainder)
+
+        BlobBlock = import_azure_storage().storage.blob.BlobBlock
+        self.blob_client.commit_block_list([BlobBlock(block_id=block_id) for block_id in self._block_ids], metadata=self.metadata, content_settings=self._get_content_settings())
+
+
+# Locks a blob using a lease on an empty lock blob next to it. Azure expires the lease itself if it stops being renewed.
+class AzureBlobLock(LeaseStorageLock):
+    def __init__(self, blob_client, timeout=None):
+        super().__init__(blob_client.blob_name, timeout)
+        self.blob_client = blob_client
+        self._lease = None
+
+    def try_acquire(self):
+        exceptions = import_azure_storage().core.exceptions
+
+        try:
+            self.blob_client.upload_blob(b'', overwrite=False)
+        except (exceptions.ResourceExistsError, exceptions.HttpResponseError):
+            # The lock blob already exists, and may be leased by another process
+            pass
+
+        try:
+            self._lease = self.blob_client.acquire_lease(lease_duration=self.lease_duration)
+        except exceptions.HttpResponseError as ex:
+            if ex.status_code == 409:
+                return False
+            raise
+
+        self._start_renewal()
+        return True
+
+    def _renew(self, content):
+        self._lease.renew()
+
+    def _delete_own(self):
+        self._lease.release()
+        self._lease = None
+
+
+class AzureBlobStorageBackend(StorageBackend):
+    def __init__(self, configuration):
+        super().__init__(configuration)
+
+        # Get the Azure Blob Storage configurations
+        self.connection_string = configuration["connection_string"]
+        self.container_name = configuration["container_name"]
+
+        # Create the blob client. It keeps its own pool of connections which is reused by every request made through it.
+        azure = import_azure_storage()
+        self.blob_service_client = azure.storage.blob.BlobServiceClient.from_connection_string(self.connection_string)
+        self.container_client = self.blob_service_client.get_container_client(self.container_name)
+
+        self._container_exists = False
+        self._lock = threading.Lock()
+
+    # Get the container client, creating the blob container the first time it is needed if it doesn't exist
+    def get_container_client(self):
+        with self._lock:
+            if not self._container_exists:
+                if not self.container_client.exists():
+                    self.container_client.create_container()
+                self._container_exists = True
+
+        return self.container_client
+
+    def exists(self, file_name):
+        return self.get_container_client().get_blob_client(file_name).exists()
+
+    def stat(self, file_name):
+        exceptions = import_azure_storage().core.exceptions
+
+        try:
+            properties = self.get_container_client().get_blob_client(file_name).get_blob_properties()
+        except exceptions.ResourceNotFoundError:
+            return None
+
+        content_md5 = properties.content_settings.content_md5
+        md5 = bytes(content_md5).hex() if content_md5 else None
+
+        return StorageObjectInfo(properties.size, properties.etag, md5, properties.metadata)
+
+    def open_write(self, file_name, metadata=None, size=None):
+        return AzureBlockBlobWriter(self.get_container_client().get_blob_client(file_name), metadata)
+
+    # The SDK would decompress a blob with a Content-Encoding itself, so it is asked for the stored bytes and open_decoded_read decompresses them
+    # The reader is seekable, so Parquet files can be read a row group at a time with ranged downloads. It reads the stored bytes, rather than having a blob with a Content-Encoding decompressed by the SDK, so that open_decoded_read can decompress them.
+    def open_read(self, file_name):
+        blob_client = self.get_container_client().get_blob_client(file_name)
+        downloader = blob_client.download_blob(decompress=False)
+
+        def open_range(offset):
+            return blob_client.download_blob(offset=offset, decompress=False).chunks()
+
+        return io.BufferedReader(RangedReader(downloader.size, open_range, downloader.chunks()), buffer_size=default_chunk_size)
+
+    def lock(self, file_name):
+        return AzureBlobLock(self.get_container_client().get_blob_client(file_name + lock_file_suffix), self.configuration.get("lock_timeout"))
+
+    # Let Azure copy the file from the Open Data Blend API rather than streaming it through this process
+    def upload_from_url(self, file_name, url, metadata=None, metrics=None):
+        # Azure copies the bytes as they are, so a data file that is to be compressed is streamed through this process instead
+        if (metadata or {}).get(cache_metadata_content_encoding) is not None:
+            return super().upload_from_url(file_name, url, metadata, metrics)
+
+        if metrics is None:
+            metrics = TransferMetrics()
+
+        # Follow any redirects to get the final location of the file. The body is never read, so only the headers are downloaded.
+        with metrics.phase('resolve'):
+            with get_session().get(url, headers=identity_encoding, stream=True) as response:
+                response.raise_for_status()
+                source_url = response.url
+                headers = response.headers
+
+        blob_client = self.get_container_client().get_blob_client(file_name)
+        source_metadata = get_source_metadata(metadata, headers)
+        size = get_transfer_size(metadata, headers)
+
+        with metrics.phase('copy'):
+            if size is not None and size <= self.configuration.get("copy_threshold", default_azure_copy_threshold):
+                blob_client.upload_blob_from_url(source_url, overwrite=True, metadata=source_metadata)
+            elif size is not None:
+                self._copy_blocks_from_url(blob_client, source_url, size, source_metadata)
+            else:
+                self._copy_from_url(blob_client, source_url, source_metadata)
+
+        # The bytes never pass through this process, so the copy can only be checked against the declared size
+        validator = self.get_validator(metadata)
+        if validator.expected_bytes is not None:
+            try:
+                validator.validate_size(file_name, blob_client.get_blob_properties().size)
+            except DataFileValidationError:
+                blob_client.delete_blob()
+                raise
+
+        # Record the size of the file
+        if size is not None:
+            metrics.add_bytes(size)
+
+    # Have the service fetch ranges of the file into blocks, several at once, and then commit them as one blob
+    def _copy_blocks_from_url(self, blob_client, source_url, size, metadata):
+        block_size = max(self.configuration.get("copy_block_size", default_azure_copy_block_size), -(-size // azure_max_blocks))
+        ranges = [(offset, min(block_size, size - offset)) for offset in range(0, size, block_size)]
+        block_ids = [base64.b64encode(f'{index:08d}'.encode()).decode() for index in range(len(ranges))]
+
+        def stage_block(index):
+            offset, length = ranges[index]
+            blob_client.stage_block_from_url(block_ids[index], source_url, source_offset=offset, source_length=length)
+
+        with ThreadPoolExecutor(max_workers=self.configuration.get("copy_max_concurrency", default_azure_copy_max_concurrency)) as executor:
+            list(executor.map(stage_block, range(len(ranges))))
+
+        BlobBlock = import_azure_storage().storage.blob.BlobBlock
+        blob_client.commit_block_list([BlobBlock(block_id=block_id) for block_id in block_ids], metadata=metadata)
+
+    # Start an asynchronous copy, which has no size limit, and wait for the service to finish it
+    def _copy_from_url(self, blob_client, source_url, metadata):
+        copy = blob_client.start_copy_from_url(source_url, metadata=metadata)
+        status = copy.get('copy_status')
+
+        while status == 'pending':
+            time.sleep(self.configuration.get("copy_poll_interval", default_azure_copy_poll_interval))
+            properties = blob_client.get_blob_properties()
+            status = properties.copy.status
+
+        if status != 'success':
+            raise IOError(f"The copy of {source_url} finished with the status '{status}'.")
+
+
+class AmazonS3Writer(StorageWriter):
+    def __init__(self, backend, object_name, metadata, part_size=default_s3_part_size, max_concurrency=default_s3_max_concurrency):
+        super().__init__(part_size)
+        self.backend = backend
+        self.object_name = object_name
+        self.metadata = metadata or {}
+        self.max_concurrency = max_concurrency
+        self._upload_id = None
+
+        # A compressed data file is given its Content-Encoding
+        content_encoding = self.metadata.get(cache_metadata_content_encoding)
+        self.object_arguments = {'ContentEncoding': content_encoding} if content_encoding else {}
+        self._parts = []
+        self._executor = None
+
+        # The ETag of an object uploaded in parts isn't its MD5, so a CRC32 of the whole object is worked out as the parts are written. S3 checks it against the bytes it received and keeps it, so verify_cache can rely on it without reading the object back.
+        self._crc32 = 0
+
+    def _write_part(self, part):
+        s3_client = self.backend.s3_client
+
+        # Start a multipart upload once there is more than one part to send
+        if self._upload_id is None:
+            self._upload_id = s3_client.create_multipart_upload(Bucket=self.backend.bucket_name, Key=self.object_name, Metadata=self.metadata, ChecksumAlgorithm='CRC32', ChecksumType='FULL_OBJECT', **self.object_arguments)['UploadId']
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+        self._crc32 = zlib.crc32(part, self._crc32)
+
+        # Limit the number of parts held in memory by waiting for the oldest part when too many are in flight
+        in_flight = [future for _, future in self._parts if not future.done()]
+        if len(in_flight) >= self.max_concurrency:
+            in_flight[0].result()
+
+        part_number = len(self._parts) + 1
+        future = self._executor.submit(s3_client.upload_part, Bucket=self.backend.bucket_name, Key=self.object_name, UploadId=self._upload_id, PartNumber=part_number, Body=part, ChecksumAlgorithm='CRC32')
+        self._parts.append((part_number, future))
+
+    def _finish(self, remainder):
+        s3_client = self.backend.s3_client
+
+        # Small objects are uploaded in a single request
+        if self._upload_id is None:
+            s3_client.put_object(Bucket=self.backend.bucket_name, Key=self.object_name, Body=remainder, Metadata=self.metadata, **self.object_arguments)
+            return
+
+        try:
+            if remainder:
+                self._write_part(remainder)
+
+            parts = [{'ETag': future.result()['ETag'], 'ChecksumCRC32': future.result()['ChecksumCRC32'], 'PartNumber': part_number} for part_number, future in self._parts]
+            checksum = base64.b64encode(self._crc32.to_bytes(4, 'big')).decode()
+            s3_client.complete_multipart_upload(Bucket=self.backend.bucket_name, Key=self.object_name, UploadId=self._upload_id, MultipartUpload={'Parts': parts}, ChecksumCRC32=checksum, ChecksumType='FULL_OBJECT')
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._executor.shutdown()
+
+    def abort(self):
+        super().abort()
+
+        if self._upload_id is not None:
+            self._executor.shutdown()
+            self.backend.s3_client.abort_multipart_upload(Bucket=self.backend.bucket_name, Key=self.object_name, UploadId=self._upload_id)
+            self._upload_id = None
+
+
+# Locks an object using a lock object that is only created if it doesn't already exist
+class AmazonS3Lock(LeaseStorageLock):
+    def __init__(self, backend, object_name, timeout=None):
+        super().__init__(object_name, timeout)
+        self.backend = backend
+        self.lock_object_name = object_name + lock_file_suffix
+        self._etag = None
+
+    def _create(self, content):
+        try:
+            self._etag = self.backend.s3_client.put_object(Bucket=self.backend.bucket_name, Key=self.lock_object_name, Body=content, IfNoneMatch='*')['ETag']
+        except self.backend.s3_client.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return False
+            raise
+
+        return True
+
+    def _read(self):
+        try:
+            response = self.backend.s3_client.get_object(Bucket=self.backend.bucket_name, Key=self.lock_object_name)
+        except self.backend.s3_client.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return None
+            raise
+
+        return response['Body'].read(), response['ETag']
+
+    def _delete(self, version):
+        try:
+            self.backend.s3_client.delete_object(Bucket=self.backend.bucket_name, Key=self.lock_object_name, IfMatch=version)
+        except self.backend.s3_client.exceptions.ClientError as e:
+            # Another process has already replaced or removed the expired lock object
+            if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict', '404', 'NoSuchKey'):
+                raise
+
+    def _renew(self, content):
+        self._etag = self.backend.s3_client.put_object(Bucket=self.backend.bucket_name, Key=self.lock_object_name, Body=content, IfMatch=self._etag)['ETag']
+
+    def _delete_own(self):
+        self._delete(self._etag)
+
+
+class AmazonS3Backend(StorageBackend):
+    def __init__(self, configuration):
+        super().__init__(configuration)
+
+        # Get the Amazon S3 bucket configurations
+        self.aws_access_key_id = configuration["aws_access_key_id"]
+        self.aws_secret_access_key = configuration["aws_secret_access_key"]
+        self.bucket_name = configuration["bucket_name"]
+        self.bucket_region = configuration["bucket_region"]
+
+        # Create the s3 client. Unlike s3 resources, clients are thread safe so a single client can be shared.
+        boto3, botocore = import_boto3()
+        self.s3_client = boto3.client('s3', aws_access_key_id=self.aws_access_key_id, aws_secret_access_key=self.aws_secret_access_key, config=botocore.config.Config(max_pool_connections=default_s3_max_pool_connections))
+
+        self._bucket_checked = False
+        self._bucket_existed = False
+        self._lock = threading.Lock()
+
+    # Create the bucket the first time it is needed if it doesn't exist. Returns False if the bucket was created by this backend before any object could have been written to it.
+    def ensure_bucket(self):
+        with self._lock:
+            if not self._bucket_checked:
+                try:
+                    self.s3_client.head_bucket(Bucket=self.bucket_name)
+                    self._bucket_existed = True
+                except self.s3_client.exceptions.ClientError:
+                    self.s3_client.create_bucket(Bucket=self.bucket_name, CreateBucketConfiguration={'LocationConstraint': self.bucket_region})
+                    self._bucket_existed = False
+                self._bucket_checked = True
+                return self._bucket_existed
+
+        return True
+
+    def stat(self, file_name):
+        # If the bucket did not exist then the object does not exist
+        if not self.ensure_bucket():
+            return None
+
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=file_name, ChecksumMode='ENABLED')
+        except self.s3_client.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ("404", "NoSuchKey"):
+                # The object doesn't exist so it needs to be uploaded
+                return None
+            else:
+                # Something else has gone wrong so we need to throw the error
+                raise
+
+        etag = head['ETag'].strip('"')
+
+        # The ETag is only the MD5 of the content for objects that were not uploaded in parts
+        md5 = etag if '-' not in etag else None
+
+        # Objects uploaded in parts have a checksum of the whole object if they were written by AmazonS3Writer, rather than only checksums of each part
+        checksum = None
+        if head.get('ChecksumType') == 'FULL_OBJECT':
+            checksum = next((head[key] for key in ('ChecksumCRC32', 'ChecksumCRC32C', 'ChecksumCRC64NVME') if head.get(key)), None)
+
+        # Metadata names travel as HTTP headers, which may have had their underscores replaced with hyphens
+        metadata = {key.replace('-', '_'): value for key, value in head.get('Metadata', {}).items()}
+
+        return StorageObjectInfo(head['ContentLength'], etag, md5, metadata, checksum)
+
+    # Plan the multipart upload from the size of the file. The part size can be raised to cut the number of requests, and is raised anyway when needed to stay within the limit on the number of parts.
+    def get_part_size(self, size=None):
+        part_size = max(self.configuration.get("part_size", default_s3_part_size), s3_min_part_size)
+
+        if size is not None:
+            part_size = max(part_size, -(-size // s3_max_parts))
+
+        return part_size
+
+    def open_write(self, file_name, metadata=None, size=None):
+        self.ensure_bucket()
+
+        # Memory use is bounded by the part size multiplied by the number of parts uploaded at once
+        return AmazonS3Writer(self, file_name, metadata, self.get_part_size(size), self.configuration.get("max_concurrency", default_s3_max_concurrency))
+
+    # The reader is seekable, so Parquet files can be read a row group at a time with ranged requests
+    def open_read(self, file_name):
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=file_name)
+
+        def open_range(offset):
+            return iter_streaming_body(self.s3_client.get_object(Bucket=self.bucket_name, Key=file_name, Range=f'bytes={offset}-')['Body'])
+
+        return io.BufferedReader(RangedReader(response['ContentLength'], open_range, iter_streaming_body(response['Body'])), buffer_size=default_chunk_size)
+
+    def lock(self, file_name):
+        self.ensure_bucket()
+
+        return AmazonS3Lock(self, file_name, self.configuration.get("lock_timeout"))
+
+
+# Streams written bytes to a blob using a resumable upload so only one chunk is held in memory at a time
+class GoogleCloudStorageWriter:
+    def __init__(self, blob, chunk_size):
+        self.bytes_written = 0
+        self.closed = False
+        self._writer = blob.open('wb', chunk_size=chunk_size, ignore_flush=True)
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return self._writer.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        self._writer.close()
+
+    def abort(self):
+        # Cancel the resumable upload so that a partial blob is never finalised
+        terminate = getattr(self._writer, 'terminate', None)
+        if terminate is not None:
+            terminate()
+        else:
+            # Older client libraries can't cancel the upload, so discard the buffered bytes to stop the writer finalising it when it is closed
+            self._writer._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# Locks a blob using a lock blob that is only created if no generation of it exists
+class GoogleCloudStorageLock(LeaseStorageLock):
+    def __init__(self, bucket, blob_name, timeout=None):
+        super().__init__(blob_name, timeout)
+        self.bucket = bucket
+        self.lock_blob_name = blob_name + lock_file_suffix
+        self._generation = None
+
+    def _create(self, content):
+        exceptions = import_google_cloud_storage().api_core.exceptions
+        blob = self.bucket.blob(self.lock_blob_name)
+
+        try:
+            blob.upload_from_string(content, if_generation_match=0)
+        except exceptions.PreconditionFailed:
+            return False
+
+        self._generation = blob.generation
+        return True
+
+    def _read(self):
+        exceptions = import_google_cloud_storage().api_core.exceptions
+        blob = self.bucket.get_blob(self.lock_blob_name)
+        if blob is None:
+            return None
+
+        try:
+            return blob.download_as_bytes(if_generation_match=blob.generation), blob.generation
+        except (exceptions.PreconditionFailed, exceptions.NotFound):
+            return None
+
+    def _delete(self, version):
+        exceptions = import_google_cloud_storage().api_core.exceptions
+
+        try:
+            self.bucket.blob(self.lock_blob_name).delete(if_generation_match=version)
+        except (exceptions.PreconditionFailed, exceptions.NotFound):
+            # Another process has already replaced or removed the expired lock blob
+            pass
+
+    def _renew(self, content):
+        blob = self.bucket.blob(self.lock_blob_name)
+        blob.upload_from_string(content, if_generation_match=self._generation)
+        self._generation = blob.generation
+
+    def _delete_own(self):
+        self._delete(self._generation)
+
+
+class GoogleCloudStorageBackend(StorageBackend):
+    def __init__(self, configuration):
+        super().__init__(configuration)
+
+        # Get the Google Cloud Storage configurations
+        self.service_account_private_key_file = configuration["service_account_private_key_file"]
+        self.bucket_name = configuration["bucket_name"]
+        self.bucket_location = configuration["bucket_location"]
+
+        # Memory use while uploading is bounded by the chunk size, which is rounded up to a multiple of 256 KB
+        chunk_size = configuration.get("chunk_size", default_gcs_chunk_size)
+        self.chunk_size = -(-chunk_size // gcs_chunk_size_multiple) * gcs_chunk_size_multiple
+
+        # Create the storage client
+        storage = import_google_cloud_storage().cloud.storage
+        if self.service_account_private_key_file != "":
+            # Attempt to load the credentials from the specified service account private key JSON file
+            self.storage_client = storage.Client.from_service_account_json(self.service_account_private_key_file)
+        else:
+            # Assume that the code is being executed within a Google Cloud environment and try to automatically pick up service account credentials
+            self.storage_client = storage.Client()
+
+        self.bucket = self.storage_client.bucket(self.bucket_name)
+
+        self._bucket_exists = False
+        self._lock = threading.Lock()
+
+    # Get the bucket, creating it the first time it is needed if it doesn't exist
+    def get_bucket(self):
+        with self._lock:
+            if not self._bucket_exists:
+                if not self.bucket.exists():
+                    self.bucket.storage_class = 'STANDARD'
+                    self.storage_client.create_bucket(self.bucket, location=self.bucket_location)
+                self._bucket_exists = True
+
+        return self.bucket
+
+    def exists(self, file_name):
+        return self.get_bucket().blob(file_name).exists()
+
+    def stat(self, file_name):
+        blob = self.get_bucket().get_blob(file_name)
+
+        if blob is None:
+            return None
+
+        md5 = base64.b64decode(blob.md5_hash).hex() if blob.md5_hash else None
+
+        return StorageObjectInfo(blob.size, blob.etag, md5, blob.metadata)
+
+    def open_write(self, file_name, metadata=None, size=None):
+        blob = self.get_bucket().blob(file_name)
+        blob.metadata = metadata
+
+        # A compressed data file is given its Content-Encoding
+        content_encoding = (metadata or {}).get(cache_metadata_content_encoding)
+        if content_encoding:
+            blob.content_encoding = content_encoding
+
+        return GoogleCloudStorageWriter(blob, self.chunk_size)
+
+    # The reader is seekable, so Parquet files can be read a row group at a time with ranged requests. It reads the stored bytes, rather than having a blob with a Content-Encoding decompressed by the service, so that open_decoded_read can decompress them.
+    def open_read(self, file_name):
+        return self.get_bucket().blob(file_name).open('rb', chunk_size=self.chunk_size, raw_download=True)
+
+    def lock(self, file_name):
+        return GoogleCloudStorageLock(self.get_bucket(), file_name, self.configuration.get("lock_timeout"))
+
+    # Small files such as the dataset metadata are uploaded in a single request
+    def write_bytes(self, file_name, data, metadata=None):
+        blob = self.get_bucket().blob(file_name)
+        blob.metadata = metadata
+        blob.upload_from_string(data)
+
+
+# The storage backends that can be selected with the file_system argument
+storage_backends = {
+    "local": LocalStorageBackend,
+    "memory": MemoryStorageBackend,
+    "azure_blob_storage": AzureBlobStorageBackend,
+    "amazon_s3": AmazonS3Backend,
+    "google_cloud_storage": GoogleCloudStorageBackend
+}
+
+_storage_backend_instances = {}
+_storage_backend_instances_lock = threading.Lock()
+
+
+# Register a storage backend so that it can be selected with the file_system argument
+def register_storage_backend(file_system, backend_type):
+    storage_backends[file_system] = backend_type
+
+
+# Get the storage backend for a file system and configuration. Backends live for the lifetime of the process so clients, connections and bucket checks are reused across calls.
+def get_storage_backend(file_system, configuration):
+    key = (file_system, json.dumps(configuration, sort_keys=True, default=str))
+
+    with _storage_backend_instances_lock:
+        if key not in _storage_backend_instances:
+            _storage_backend_instances[key] = storage_backends[file_system](configuration)
+
+        return _storage_backend_instances[key]
+
+
+def clear_storage_backends():
+    with _storage_backend_instances_lock:
+        _storage_backend_instances.clear()
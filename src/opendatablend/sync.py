@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from opendatablend.opendatablend import get_data_file_name, get_data_file_cache_metadata, get_cached_data_file_name, check_cached_data_file, cache_date_file, cache_dataset_metadata
+from opendatablend.api import get_download_path
+from opendatablend.metadata import get_dataset
+from opendatablend.metrics import TransferMetrics, emit_metrics
+from opendatablend.storage import storage_backends, get_storage_backend, cache_metadata_bytes
+
+# The default limits on the number of data files transferred at once in total, from one host and into one file system
+default_sync_max_workers = 8
+default_sync_max_workers_per_host = 4
+default_sync_max_workers_per_backend = 8
+
+
+class SyncTransfer:
+    def __init__(self, dataset_path, resource_name, file_system, data_file_name='', size=None, seconds=None, error=None, cached=None):
+        self.dataset_path = dataset_path
+        self.resource_name = resource_name
+        self.file_system = file_system
+        self.data_file_name = data_file_name
+        self.size = size
+        self.seconds = seconds
+        self.error = error
+        # Whether the data file was already cached and current when the sync was planned
+        self.cached = cached
+        self.metrics = TransferMetrics(resource_name, file_system)
+
+
+class SyncSummary:
+    def __init__(self, transfers, metadata_file_names, seconds):
+        self.transfers = transfers
+        # The cached dataset metadata file name for each dataset path
+        self.metadata_file_names = metadata_file_names
+        self.seconds = seconds
+
+    @property
+    def succeeded(self):
+        return [transfer for transfer in self.transfers if transfer.error is None]
+
+    @property
+    def failed(self):
+        return [transfer for transfer in self.transfers if transfer.error is not None]
+
+
+class SyncTask:
+    def __init__(self, entry, dataset, data_file, transfer):
+        self.entry = entry
+        self.dataset = dataset
+        self.data_file = data_file
+        self.transfer = transfer
+        self.host = urlparse(data_file.path).netloc
+        self.backend_key = (entry["file_system"], json.dumps(entry["configuration"], sort_keys=True, default=str))
+
+
+# Fill in the optional values of a manifest entry so that it reads like the arguments to get_data_files
+def get_manifest_entry(entry):
+    return {
+        "dataset_path": entry["dataset_path"],
+        "resource_names": list(entry["resource_names"]),
+        "base_path": entry.get("base_path", '/'),
+        "access_key": entry.get("access_key", ''),
+        "file_system": entry.get("file_system", 'local'),
+        "configuration": entry.get("configuration", {}),
+        "refresh": entry.get("refresh", False),
+        "convert_to_parquet": entry.get("convert_to_parquet", False)
+    }
+
+
+# Sync the data files of several datasets. Each manifest entry takes the same values as get_data_files. Every transfer is scheduled through one pool of workers, largest data files first, without exceeding the limits per host and per file system.
+def sync(manifest, max_workers=default_sync_max_workers, max_workers_per_host=default_sync_max_workers_per_host, max_workers_per_backend=default_sync_max_workers_per_backend):
+    start_time = time.perf_counter()
+    entries = [get_manifest_entry(entry) for entry in manifest]
+    datasets, tasks, transfers = get_sync_tasks(entries, max_workers)
+
+    run_tasks(tasks, max(1, max_workers), max(1, max_workers_per_host), max(1, max_workers_per_backend))
+
+    # Save a copy of the dataset metadata once for each dataset and destination that any data files were cached in
+    cached_entries = [task.entry for task in tasks if task.transfer.error is None]
+    metadata_file_names = {}
+    for entry, dataset in zip(entries, datasets):
+        if entry["dataset_path"].startswith('http') and not isinstance(dataset, Exception) and any(cached_entry is entry for cached_entry in cached_entries):
+            metadata_file_names[entry["dataset_path"]] = cache_dataset_metadata(dataset, entry["base_path"], entry["file_system"], entry["configuration"])
+
+    return SyncSummary(transfers, metadata_file_names, time.perf_counter() - start_time)
+
+
+# Plan a sync without transferring anything. Each transfer in the returned summary records the data file name, its size and whether it is already cached, so the data files that a sync would transfer are those that aren't cached.
+def plan_sync(manifest, max_workers=default_sync_max_workers):
+    start_time = time.perf_counter()
+    entries = [get_manifest_entry(entry) for entry in manifest]
+    datasets, tasks, transfers = get_sync_tasks(entries, max_workers)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        list(executor.map(check_task, tasks))
+
+    return SyncSummary(transfers, {}, time.perf_counter() - start_time)
+
+
+# Load the metadata for every dataset in the manifest and create a task for each data file, largest first
+def get_sync_tasks(entries, max_workers):
+    # Get the metadata for every dataset in the manifest. A dataset whose metadata can't be loaded fails each of its transfers.
+    def get_dataset_or_error(entry):
+        try:
+            return get_dataset(entry["dataset_path"])
+        except Exception as ex:
+            print(f"The dataset metadata for '{entry['dataset_path']}' could not be loaded: {ex}")
+            return ex
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        datasets = list(executor.map(get_dataset_or_error, entries))
+
+    tasks = []
+    transfers = []
+    for entry, dataset in zip(entries, datasets):
+        for resource_name in entry["resource_names"]:
+            transfer = SyncTransfer(entry["dataset_path"], resource_name, entry["file_system"])
+            transfers.append(transfer)
+
+            if isinstance(dataset, Exception):
+                transfer.error = dataset
+                continue
+
+            try:
+                data_file = dataset.get_resource(resource_name)
+            except Exception as ex:
+                transfer.error = ex
+                print(f"The data file for resource '{resource_name}' could not be cached: {ex}")
+                continue
+
+            size = get_data_file_cache_metadata(data_file).get(cache_metadata_bytes)
+            transfer.size = int(size) if size is not None else None
+            tasks.append(SyncTask(entry, dataset, data_file, transfer))
+
+    # Start the largest data files first so that the long transfers overlap with the short ones, which shortens the overall run
+    tasks.sort(key=lambda task: task.transfer.size or 0, reverse=True)
+
+    return datasets, tasks, transfers
+
+
+# Check whether the data file for a task is already cached, in the same way as cache_date_file does before transferring it
+def check_task(task):
+    entry = task.entry
+    start_time = time.perf_counter()
+
+    try:
+        if entry["file_system"] not in storage_backends:
+            raise ValueError(f"The file system '{entry['file_system']}' is not supported.")
+
+        backend = get_storage_backend(entry["file_system"], entry["configuration"])
+
+        task.transfer.data_file_name = get_cached_data_file_name(backend, task.data_file, get_data_file_name(task.data_file, entry["base_path"]), entry["convert_to_parquet"])[0]
+        task.transfer.cached, _ = check_cached_data_file(backend, task.transfer.data_file_name, task.data_file, get_download_path(task.data_file, entry["access_key"]), entry["refresh"])
+    except Exception as ex:
+        task.transfer.error = ex
+        print(f"The data file for resource '{task.transfer.resource_name}' could not be checked: {ex}")
+    finally:
+        task.transfer.seconds = time.perf_counter() - start_time
+
+
+def run_task(task):
+    entry = task.entry
+    start_time = time.perf_counter()
+
+    try:
+        task.transfer.data_file_name = cache_date_file(task.data_file, get_data_file_name(task.data_file, entry["base_path"]), entry["access_key"], entry["file_system"], entry["configuration"], entry["refresh"], task.transfer.metrics, entry["convert_to_parquet"], entry["base_path"])
+    except Exception as ex:
+        # Record the failure and carry on so that one bad data file does not stop the rest of the sync
+        task.transfer.error = ex
+        task.transfer.metrics.error = ex
+        print(f"The data file for resource '{task.transfer.resource_name}' could not be cached: {ex}")
+    finally:
+        task.transfer.seconds = time.perf_counter() - start_time
+        emit_metrics(task.transfer.metrics)
+
+
+# Run the tasks in order, starting each one as soon as a worker is free and neither its host nor its file system is at its limit
+def run_tasks(tasks, max_workers, max_workers_per_host, max_workers_per_backend):
+    pending = list(tasks)
+    running_per_host = {}
+    running_per_backend = {}
+    running = [0]
+    condition = threading.Condition()
+
+    def can_start(task):
+        return running_per_host.get(task.host, 0) < max_workers_per_host and running_per_backend.get(task.backend_key, 0) < max_workers_per_backend
+
+    def task_done(task):
+        with condition:
+            running[0] -= 1
+            running_per_host[task.host] -= 1
+            running_per_backend[task.backend_key] -= 1
+            condition.notify()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        with condition:
+            while pending or running[0] > 0:
+                task = next((task for task in pending if can_start(task)), None) if running[0] < max_workers else None
+
+                if task is None:
+                    condition.wait()
+                    continue
+
+                pending.remove(task)
+                running[0] += 1
+                running_per_host[task.host] = running_per_host.get(task.host, 0) + 1
+                running_per_backend[task.backend_key] = running_per_backend.get(task.backend_key, 0) + 1
+
+                future = executor.submit(run_task, task)
+                future.add_done_callback(lambda _, task=task: task_done(task))
@@ -0,0 +1,25 @@
+import opendatablend as odb
+
+dataset_path = 'https://packages.opendatablend.io/v1/open-data-blend-road-safety/datapackage.json'
+access_key = '<ACCESS_KEY_HERE>' # The access key can be set to an empty string if you are making a public API request
+
+# Specify the resource names of the data files. In this example, a subset of the available data files will be requested in Parquet format.
+resource_names = [
+    'date-parquet',
+    'time-of-day-parquet',
+    'geolocation-parquet',
+    'road-safety-accident-info-parquet',
+    'road-safety-accident-location-parquet',
+    'road-safety-accident-2021-parquet'
+    ]
+
+# Get the data files using four concurrent downloads and store the output object. A data file that fails is recorded in the output rather than raised.
+output = odb.get_data_files(dataset_path, resource_names, access_key=access_key, max_workers=4, raise_errors=False)
+
+# Print the file locations
+print(output.data_file_names)
+print(output.metadata_file_name)
+
+# Print the per-resource timings and any errors
+print(output.timings)
+print(output.errors)
\ No newline at end of file
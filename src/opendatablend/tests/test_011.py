@@ -0,0 +1,22 @@
+import asyncio
+import opendatablend as odb
+
+dataset_path = 'https://packages.opendatablend.io/v1/open-data-blend-road-safety/datapackage.json'
+access_key = '<ACCESS_KEY_HERE>' # The access key can be set to an empty string if you are making a public API request
+
+# Specify the resource names of the data files. In this example, a subset of the available data files will be requested in Parquet format.
+resource_names = [
+    'date-parquet',
+    'time-of-day-parquet',
+    'geolocation-parquet',
+    'road-safety-accident-info-parquet',
+    'road-safety-accident-location-parquet',
+    'road-safety-accident-2021-parquet'
+    ]
+
+# Get the data files from an event loop and store the output object
+output = asyncio.run(odb.aget_data_files(dataset_path, resource_names, access_key=access_key, max_concurrency=4))
+
+# Print the file locations
+print(output.data_file_names)
+print(output.metadata_file_name)
\ No newline at end of file
@@ -0,0 +1,26 @@
+import opendatablend as odb
+
+access_key = '<ACCESS_KEY_HERE>' # The access key can be set to an empty string if you are making a public API request
+
+# Specify the datasets and data files to sync. In this example, data files from two datasets will be requested in Parquet format.
+manifest = [
+    {
+        "dataset_path" : "https://packages.opendatablend.io/v1/open-data-blend-road-safety/datapackage.json",
+        "resource_names" : ["date-parquet", "time-of-day-parquet", "road-safety-accident-2021-parquet"],
+        "access_key" : access_key
+    },
+    {
+        "dataset_path" : "https://packages.opendatablend.io/v1/open-data-blend-nhs-english-prescribing-data/datapackage.json",
+        "resource_names" : ["date-parquet"],
+        "access_key" : access_key
+    }
+    ]
+
+# Sync the data files and store the summary
+summary = odb.sync(manifest, max_workers=4)
+
+# Print the file locations and any errors
+for transfer in summary.transfers:
+    print(transfer.resource_name, transfer.data_file_name, transfer.error)
+
+print(summary.metadata_file_names)
\ No newline at end of file
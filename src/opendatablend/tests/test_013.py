@@ -0,0 +1,13 @@
+import opendatablend as odb
+
+dataset_path = 'https://packages.opendatablend.io/v1/open-data-blend-road-safety/datapackage.json'
+access_key = '<ACCESS_KEY_HERE>' # The access key can be set to an empty string if you are making a public API request
+
+# Specify the resource name of the data file. In this example, the 'date' data file will be requested in Parquet format.
+resource_name = 'date-parquet'
+
+# Read a subset of the columns and rows straight into a dataframe, caching the data file at the same time
+df = odb.load_data(dataset_path, resource_name, access_key=access_key, columns=['drv_date_key', 'drv_date', 'drv_year'], filters=[('drv_year', '>=', 2020)], cache=True)
+
+# Check the contents of the dataframe
+print(df.head())
\ No newline at end of file
@@ -0,0 +1,15 @@
+import opendatablend as odb
+
+dataset_path = 'https://packages.opendatablend.io/v1/open-data-blend-road-safety/datapackage.json'
+access_key = '<ACCESS_KEY_HERE>' # The access key can be set to an empty string if you are making a public API request
+
+# Specify the resource name of the data file. In this example, the 2021 accident data file will be requested in CSV format.
+resource_name = 'road-safety-accident-2021-csv'
+
+# Read the data file in batches of rows without holding all of it in memory
+row_count = 0
+for batch in odb.iter_resource(dataset_path, resource_name, batch_size=100000, access_key=access_key):
+    row_count += batch.num_rows
+
+# Print the number of rows in the data file
+print(row_count)
\ No newline at end of file
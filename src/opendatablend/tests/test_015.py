@@ -0,0 +1,15 @@
+import opendatablend as odb
+
+dataset_path = 'https://packages.opendatablend.io/v1/open-data-blend-road-safety/datapackage.json'
+access_key = '<ACCESS_KEY_HERE>' # The access key can be set to an empty string if you are making a public API request
+
+# Specify the resource names of the data files. In this example, the date and 2021 accident data files will be checked in Parquet format.
+resource_names = ['date-parquet', 'road-safety-accident-2021-parquet']
+
+# Cache the data files, then check them against the dataset metadata and download any that are missing or don't match again
+odb.get_data_files(dataset_path, resource_names, base_path='./', access_key=access_key)
+verification = odb.verify_cache(dataset_path, resource_names, base_path='./', access_key=access_key, repair=True)
+
+# Print the status of each data file
+for verified_data_file in verification.data_files:
+    print(verified_data_file.resource_name, verified_data_file.status, verified_data_file.repaired)
\ No newline at end of file
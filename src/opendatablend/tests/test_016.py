@@ -0,0 +1,23 @@
+import opendatablend as odb
+
+dataset_path = 'https://packages.opendatablend.io/v1/open-data-blend-road-safety/datapackage.json'
+access_key = '<ACCESS_KEY_HERE>' # The access key can be set to an empty string if you are making a public API request
+
+# Specify the resource name of the data file. In this example, the 2021 accident data file will be requested in CSV format.
+resource_name = 'road-safety-accident-2021-csv'
+
+# Cache the data file compressed with gzip
+configuration = {
+    "compression" : "gzip"
+    }
+
+output = odb.get_data(dataset_path, resource_name, base_path='./', access_key=access_key, configuration=configuration)
+
+# The local file is named with a .gz extension, so pandas can read it directly
+print(output.data_file_name)
+
+# Read the cached data file, which is decompressed as it is read
+df = odb.load_data(dataset_path, resource_name, access_key=access_key, cache=True, base_path='./', configuration=configuration)
+
+# Print the number of rows in the data file
+print(len(df))
\ No newline at end of file
@@ -0,0 +1,181 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from opendatablend.opendatablend import get_data_file_name, get_data_file_cache_metadata, get_cached_data_file_name, cache_date_file
+from opendatablend.metadata import get_dataset
+from opendatablend.metrics import TransferMetrics, emit_metrics
+from opendatablend.storage import DataFileValidator, DataFileValidationError, storage_backends, get_storage_backend, is_cached_file_current, default_chunk_size, cache_metadata_hash, cache_metadata_validated, cache_metadata_converted_from, cache_metadata_content_encoding
+
+# The number of data files checked at once by verify_cache when no limit is given
+default_verify_max_workers = 8
+
+# The outcomes of checking a cached data file. Data files with any status other than valid or unverified can be repaired.
+verify_status_valid = 'valid'
+verify_status_unverified = 'unverified'
+verify_status_missing = 'missing'
+verify_status_size_mismatch = 'size_mismatch'
+verify_status_hash_mismatch = 'hash_mismatch'
+verify_status_stale = 'stale'
+verify_status_error = 'error'
+repairable_statuses = {verify_status_missing, verify_status_size_mismatch, verify_status_hash_mismatch, verify_status_stale}
+
+
+class VerifiedDataFile:
+    def __init__(self, resource_name, data_file_name, status=None, expected_size=None, size=None, method=None, error=None):
+        self.resource_name = resource_name
+        self.data_file_name = data_file_name
+        self.status = status
+        self.expected_size = expected_size
+        self.size = size
+        # How the data file was checked: 'storage_md5' if the MD5 checksum held by the storage service was compared, 'storage_checksum' if the storage service holds another checksum of the data file that it checked when the data file was cached, 'read' if the data file was read back and hashed, 'size' if only its size was compared, or 'metadata' if only what was recorded when it was cached was compared
+        self.method = method
+        self.error = error
+        self.repaired = False
+
+
+class CacheVerification:
+    def __init__(self, data_files, seconds):
+        self.data_files = data_files
+        self.seconds = seconds
+
+    @property
+    def valid(self):
+        return [data_file for data_file in self.data_files if data_file.status in (verify_status_valid, verify_status_unverified)]
+
+    @property
+    def invalid(self):
+        return [data_file for data_file in self.data_files if data_file.status not in (verify_status_valid, verify_status_unverified)]
+
+
+# Read a cached data file back, decompressing it if it was compressed when it was cached, and check its size and hash
+def read_back_data_file(backend, info, validator, verified):
+    verified.method = 'read'
+    with backend.open_decoded_read(verified.data_file_name, info) as input_file:
+        for chunk in iter(lambda: input_file.read(default_chunk_size), b''):
+            validator.update(chunk)
+
+    try:
+        validator.validate(verified.data_file_name)
+    except DataFileValidationError as ex:
+        verified.status = verify_status_size_mismatch if validator.expected_bytes is not None and validator.size != validator.expected_bytes else verify_status_hash_mismatch
+        verified.error = ex
+        return
+
+    verified.status = verify_status_valid
+
+
+# Check a cached data file against the size and hash declared in the dataset metadata. The checksum held by the storage service is used where there is one, so that the data file doesn't have to be read back.
+def verify_data_file(backend, data_file, verified, deep):
+    expected_metadata = get_data_file_cache_metadata(data_file)
+    validator = DataFileValidator(expected_metadata)
+    verified.expected_size = validator.expected_bytes
+
+    info = backend.stat(verified.data_file_name)
+
+    if info is None:
+        verified.status = verify_status_missing
+        return
+
+    verified.size = info.size
+    stored_metadata = info.metadata or {}
+
+    # A converted data file can't be compared with the data file it was converted from, so check that it was converted from the data file that is published now
+    if stored_metadata.get(cache_metadata_converted_from):
+        verified.method = 'metadata'
+        verified.status = verify_status_valid if is_cached_file_current(info, expected_metadata) else verify_status_stale
+        return
+
+    # The size and checksum held by the file system are those of the compressed bytes, so a compressed data file is decompressed as it is read back
+    if stored_metadata.get(cache_metadata_content_encoding):
+        if validator.has_checks and deep:
+            read_back_data_file(backend, info, validator, verified)
+        elif validator.has_checks:
+            verified.method = 'metadata'
+            verified.status = verify_status_valid if is_cached_file_current(info, expected_metadata) else verify_status_stale
+        else:
+            verified.status = verify_status_unverified
+        return
+
+    try:
+        validator.validate_size(verified.data_file_name, info.size)
+    except DataFileValidationError as ex:
+        verified.status = verify_status_size_mismatch
+        verified.error = ex
+        return
+
+    if validator.hash_algorithm == 'md5' and info.md5:
+        verified.method = 'storage_md5'
+        verified.status = verify_status_valid if info.md5 == validator.expected_digest else verify_status_hash_mismatch
+        return
+
+    # The checksum can't be compared with the declared hash, which is in another algorithm. A data file that was checked against the declared hash as it was cached, though, was received intact by the storage service, which checked the bytes against the checksum, so it still has that hash. A data file cached with validation turned off is read back instead.
+    if validator.hash_algorithm is not None and info.checksum and stored_metadata.get(cache_metadata_validated) and stored_metadata.get(cache_metadata_hash) == expected_metadata.get(cache_metadata_hash):
+        verified.method = 'storage_checksum'
+        verified.status = verify_status_valid
+        return
+
+    if validator.hash_algorithm is not None and deep:
+        read_back_data_file(backend, info, validator, verified)
+        return
+
+    if validator.expected_bytes is not None:
+        verified.method = 'size'
+        verified.status = verify_status_valid
+        return
+
+    # The dataset metadata doesn't declare a size or hash for the data file
+    verified.status = verify_status_unverified
+
+
+# Check the cached data files of a dataset against the sizes and hashes in the dataset metadata, several at once. If repair is set, the data files that are missing or don't match are downloaded again.
+# Without resource_names, only the data files that have been cached are checked. Name the resources to also report, and repair, the ones that are missing.
+# When the storage service doesn't hold an MD5 checksum for a data file, it is read back and hashed. Set deep to False to only compare the size of those data files.
+def verify_cache(dataset_path, resource_names=None, base_path='/', access_key='', file_system='local', configuration={}, max_workers=default_verify_max_workers, repair=False, deep=True, convert_to_parquet=False):
+    if file_system not in storage_backends:
+        raise ValueError(f"The file system '{file_system}' is not supported.")
+
+    start_time = time.perf_counter()
+    backend = get_storage_backend(file_system, configuration)
+
+    # Check every data file in the dataset unless only some are asked for
+    dataset = get_dataset(dataset_path)
+    check_all = resource_names is None
+    if check_all:
+        resource_names = [resource.name for resource in dataset.resources]
+
+    def verify_resource(resource_name):
+        verified = VerifiedDataFile(resource_name, '')
+
+        try:
+            data_file = dataset.get_resource(resource_name)
+
+            verified.data_file_name = get_cached_data_file_name(backend, data_file, get_data_file_name(data_file, base_path), convert_to_parquet)[0]
+
+            verify_data_file(backend, data_file, verified, deep)
+        except Exception as ex:
+            verified.status = verify_status_error
+            verified.error = ex
+            print(f"The data file for resource '{resource_name}' could not be verified: {ex}")
+            return verified
+
+        # A data file that was never cached isn't a fault in the cache unless it was asked for
+        if check_all and verified.status == verify_status_missing:
+            return None
+
+        if repair and verified.status in repairable_statuses:
+            metrics = TransferMetrics(resource_name, file_system)
+            try:
+                cache_date_file(data_file, get_data_file_name(data_file, base_path), access_key, file_system, configuration, metrics=metrics, convert_to_parquet=convert_to_parquet, base_path=base_path, force=True)
+                verified.repaired = True
+            except Exception as ex:
+                metrics.error = ex
+                verified.error = ex
+                print(f"The data file for resource '{resource_name}' could not be repaired: {ex}")
+            finally:
+                emit_metrics(metrics)
+
+        return verified
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        data_files = [verified for verified in executor.map(verify_resource, resource_names) if verified is not None]
+
+    return CacheVerification(data_files, time.perf_counter() - start_time)